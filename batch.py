@@ -0,0 +1,108 @@
+"""Parsing and serialisation helpers for batch username lookups."""
+
+import csv
+import io
+import json
+import re
+from typing import Iterable, List, Optional, Tuple
+
+from instagram import normalize_username
+
+_SEPARATORS = re.compile(r"[\s,;]+")
+_HEADER_NAMES = ("username", "usernames", "handle", "instagram")
+
+FIELDS = (
+    "username",
+    "status",
+    "id",
+    "full_name",
+    "followers",
+    "following",
+    "posts",
+    "is_private",
+    "profile_pic_url",
+)
+
+
+def parse_usernames(tokens: Iterable[str], limit: int) -> Tuple[List[str], int]:
+    """Return up to ``limit`` distinct valid usernames and how many were cut off.
+
+    Tokens are canonicalised with :func:`instagram.normalize_username`, so
+    ``@User`` and profile links count as the same username; invalid tokens
+    are skipped.
+    """
+    seen = set()
+    usernames = []
+    for token in tokens:
+        name = normalize_username(token)
+        if name is None or name in seen:
+            continue
+        seen.add(name)
+        usernames.append(name)
+    return usernames[:limit], max(0, len(usernames) - limit)
+
+
+def split_text(text: str) -> List[str]:
+    """Split a message into candidate usernames on whitespace, commas and semicolons."""
+    return [token for token in _SEPARATORS.split(text) if token]
+
+
+def split_document(text: str, filename: Optional[str]) -> List[str]:
+    """Return candidate usernames from an uploaded text or CSV document.
+
+    For CSV files the ``username`` (or ``handle``) column is used when a header
+    names one, otherwise the first column.
+    """
+    if not (filename or "").lower().endswith(".csv"):
+        return split_text(text)
+    rows = [row for row in csv.reader(io.StringIO(text)) if row]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    column = next((header.index(name) for name in _HEADER_NAMES if name in header), None)
+    if column is None:
+        column = 0
+    else:
+        rows = rows[1:]
+    return [row[column] for row in rows if len(row) > column]
+
+
+def result_row(username: str, data: Optional[dict]) -> dict:
+    """Flatten a lookup result into one output row with the :data:`FIELDS` keys."""
+    row = dict.fromkeys(FIELDS, "")
+    row["username"] = username
+    if data is None:
+        row["status"] = "failed"
+        return row
+    if data.get("error"):
+        row["status"] = data["error"]
+        return row
+    try:
+        user = data["data"]["user"]
+    except (KeyError, TypeError):
+        row["status"] = "failed"
+        return row
+    row.update(
+        status="ok",
+        id=user.get("id", ""),
+        full_name=user.get("full_name", ""),
+        followers=user.get("follower_count", ""),
+        following=user.get("following_count", ""),
+        posts=user.get("media_count", ""),
+        is_private=user.get("is_private", ""),
+        profile_pic_url=user.get("profile_pic_url") or "",
+    )
+    return row
+
+
+def to_csv(rows: Iterable[dict]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    # BOM so spreadsheet apps detect UTF-8 (names are often non-Latin).
+    return buffer.getvalue().encode("utf-8-sig")
+
+
+def to_jsonl(rows: Iterable[dict]) -> bytes:
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
@@ -0,0 +1,58 @@
+"""Load test: update throughput of ``ChatOrderedUpdateProcessor`` by concurrency.
+
+Simulates ``CHATS`` chats each sending ``PER_CHAT`` updates whose handler
+waits ``HANDLER_LATENCY`` seconds (standing in for an Instagram lookup and a
+Telegram reply), and reports updates per second for several concurrency
+limits. Per-chat ordering is asserted on every run.
+
+Run with ``python benchmarks/bench_concurrency.py``.
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from concurrency import ChatOrderedUpdateProcessor  # noqa: E402
+
+CHATS = 200
+PER_CHAT = 3
+HANDLER_LATENCY = 0.02
+LIMITS = (1, 4, 16, 64)
+
+
+async def _run(limit: int) -> float:
+    processor = ChatOrderedUpdateProcessor(limit)
+    seen = {chat: [] for chat in range(CHATS)}
+
+    async def handler(chat: int, n: int) -> None:
+        await asyncio.sleep(HANDLER_LATENCY)
+        seen[chat].append(n)
+
+    updates = [(chat, n) for n in range(PER_CHAT) for chat in range(CHATS)]
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            processor.process_update(
+                SimpleNamespace(effective_chat=SimpleNamespace(id=chat)),
+                handler(chat, n),
+            )
+            for chat, n in updates
+        )
+    )
+    elapsed = time.perf_counter() - started
+    assert all(order == list(range(PER_CHAT)) for order in seen.values())
+    return len(updates) / elapsed
+
+
+def main() -> None:
+    for limit in LIMITS:
+        throughput = asyncio.run(_run(limit))
+        print(f"concurrency {limit:>3}: {throughput:8.1f} updates/s")
+
+
+if __name__ == "__main__":
+    main()
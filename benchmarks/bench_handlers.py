@@ -0,0 +1,326 @@
+"""Replay synthetic traffic through the bot's handlers and report latencies.
+
+Updates arrive open-loop at ``--rate`` per second and are processed by the
+same ``ChatOrderedUpdateProcessor`` the bot uses. The mix contains username
+messages (``handle_username``), menu button taps and inline queries, in
+proportions set by ``--mix``. ``instaloader`` is replaced by a fake whose
+lookups take ``--instagram-latency`` seconds and fail with HTTP 429 with
+probability ``--error-rate``, and Telegram calls are fakes that take
+``--telegram-latency`` seconds. ``--hit-ratio`` of the lookups target
+usernames that were cached before the run.
+
+For each handler the p50/p95/p99 latency (arrival to completion, including
+time spent waiting for a concurrency slot) is reported, together with overall
+throughput and peak RSS. ``--output`` saves the results as JSON and
+``--baseline`` compares them with a previously saved run. Runs with the same
+``--seed`` replay the same traffic.
+
+Run with ``python benchmarks/bench_handlers.py --duration 10 --rate 200``.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+HANDLERS = ("handle_username", "menu", "inline_query")
+
+
+def _install_fake_instaloader(fault: SimpleNamespace, seed: int) -> None:
+    """Register a fake ``instaloader`` module with injected latency and 429s.
+
+    ``fault.latency`` and ``fault.error_rate`` are read on every lookup so
+    they can be switched off while the cache is warmed.
+    """
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class HTTPError(Exception):
+        def __init__(self, status_code):
+            super().__init__(f"HTTP {status_code}")
+            self.status_code = status_code
+
+    class Profile:
+        def __init__(self, username):
+            self.userid = zlib.crc32(username.encode())
+            self.username = username
+            self.full_name = username.title()
+            self.biography = "Synthetic profile used by the benchmark."
+            self.followers = 1234
+            self.followees = 56
+            self.is_private = False
+            self.mediacount = 78
+            self.profile_pic_url = f"https://example.invalid/{username}.jpg"
+
+        @staticmethod
+        def from_username(context, username):
+            time.sleep(fault.latency)
+            with lock:
+                failed = rng.random() < fault.error_rate
+            if failed:
+                raise HTTPError(429)
+            return Profile(username)
+
+    class Instaloader:
+        def __init__(self):
+            self.context = object()
+
+    module = ModuleType("instaloader")
+    module.Instaloader = Instaloader
+    module.Profile = Profile
+    module.exceptions = SimpleNamespace(
+        ProfileNotExistsException=type("ProfileNotExistsException", (Exception,), {}),
+        PrivateProfileNotFollowedException=type(
+            "PrivateProfileNotFollowedException", (Exception,), {}
+        ),
+        HTTPError=HTTPError,
+    )
+    sys.modules["instaloader"] = module
+
+
+def _import_bot(args, fault: SimpleNamespace):
+    """Import ``telegram_bot`` configured for an isolated, in-memory run."""
+    os.environ.update(
+        {
+            "LOG_LEVEL": "ERROR",
+            "LOG_FILE": "",
+            "USER_DB_PATH": "",
+            "CACHE_DB_PATH": "",
+            "METRICS_PORT": "0",
+            "INLINE_DEBOUNCE": str(args.inline_debounce),
+            "INSTAGRAM_RATE_LIMIT": str(args.instagram_rate_limit),
+            "INSTAGRAM_RATE_BURST": str(max(1, int(args.instagram_rate_limit))),
+        }
+    )
+    _install_fake_instaloader(fault, args.seed)
+    import telegram_bot
+
+    return telegram_bot
+
+
+class _FakeTelegram:
+    """Stands in for the Bot API: every call just sleeps for ``latency``."""
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.calls = 0
+        self._file_ids = 0
+
+    async def call(self, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+    async def reply_photo(self, *args, **kwargs):
+        await self.call()
+        self._file_ids += 1
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=f"file-{self._file_ids}")])
+
+
+def _message_update(telegram: _FakeTelegram, chat_id: int, text: str):
+    message = SimpleNamespace(
+        text=text, reply_text=telegram.call, reply_photo=telegram.reply_photo
+    )
+    return SimpleNamespace(
+        message=message,
+        effective_chat=SimpleNamespace(id=chat_id),
+        effective_user=SimpleNamespace(id=chat_id),
+    )
+
+
+def _inline_update(telegram: _FakeTelegram, user_id: int, query: str):
+    return SimpleNamespace(
+        inline_query=SimpleNamespace(query=query, answer=telegram.call),
+        effective_chat=None,
+        effective_user=SimpleNamespace(id=user_id),
+    )
+
+
+def _percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def _peak_rss_kb() -> int:
+    if resource is None:  # pragma: no cover - Windows
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+async def _run(bot, args, fault: SimpleNamespace) -> dict:
+    import messages
+    from concurrency import ChatOrderedUpdateProcessor
+
+    rng = random.Random(args.seed)
+    telegram = _FakeTelegram(args.telegram_latency)
+    processor = ChatOrderedUpdateProcessor(args.concurrency)
+    contexts = {}
+    latencies = {name: [] for name in HANDLERS}
+    errors = {name: 0 for name in HANDLERS}
+
+    hot = [f"hot_user{i}" for i in range(args.hot_users)]
+    fault.latency, fault.error_rate = 0, 0
+    for name in hot:
+        bot._PROFILE_CACHE.set(name, bot._load_profile(name))
+    fault.latency, fault.error_rate = args.instagram_latency, args.error_rate
+    cold = (f"cold_user{i}" for i in range(10**9))
+    buttons = [
+        messages.get_message(key, messages.DEFAULT_LANG)
+        for key in ("btn_help", "btn_about", "btn_language", "btn_back", "btn_start")
+    ]
+    weights = [args.mix[name] for name in HANDLERS]
+
+    def context_for(chat_id: int):
+        context = contexts.get(chat_id)
+        if context is None:
+            context = contexts[chat_id] = SimpleNamespace(
+                user_data={},
+                bot=SimpleNamespace(send_chat_action=telegram.call),
+            )
+        return context
+
+    async def timed(kind: str, arrived: float, coroutine) -> None:
+        try:
+            await coroutine
+        except Exception:
+            errors[kind] += 1
+        latencies[kind].append(time.perf_counter() - arrived)
+
+    total = int(args.rate * args.duration)
+    tasks = []
+    started = time.perf_counter()
+    for i in range(total):
+        delay = started + i / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind = rng.choices(HANDLERS, weights)[0]
+        chat_id = rng.randrange(args.chats)
+        username = rng.choice(hot) if rng.random() < args.hit_ratio else next(cold)
+        if kind == "inline_query":
+            update = _inline_update(telegram, chat_id, username)
+            handler = bot.inline_query
+        else:
+            text = username if kind == "handle_username" else rng.choice(buttons)
+            update = _message_update(telegram, chat_id, text)
+            handler = bot.handle_text
+        arrived = time.perf_counter()
+        tasks.append(
+            asyncio.ensure_future(
+                processor.process_update(
+                    update, timed(kind, arrived, handler(update, context_for(chat_id)))
+                )
+            )
+        )
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    report = {}
+    for kind in HANDLERS:
+        values = latencies[kind]
+        report[kind] = {
+            "count": len(values),
+            "errors": errors[kind],
+            "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+            "p50_ms": round(_percentile(values, 50) * 1000, 3),
+            "p95_ms": round(_percentile(values, 95) * 1000, 3),
+            "p99_ms": round(_percentile(values, 99) * 1000, 3),
+        }
+    return {
+        "config": {
+            key: value for key, value in vars(args).items() if key not in ("output", "baseline")
+        },
+        "python": platform.python_version(),
+        "updates": total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput": round(total / elapsed, 1),
+        "telegram_calls": telegram.calls,
+        "peak_rss_kb": _peak_rss_kb(),
+        "handlers": report,
+        "cache": bot._PROFILE_CACHE.stats(),
+    }
+
+
+def _print_report(result: dict, baseline: dict = None) -> None:
+    print(
+        f"{result['updates']} updates in {result['elapsed_s']}s: "
+        f"{result['throughput']} updates/s, peak RSS {result['peak_rss_kb']} KiB"
+    )
+    for kind, row in result["handlers"].items():
+        line = (
+            f"{kind:>16}: n={row['count']:<6} p50={row['p50_ms']:8.2f}ms "
+            f"p95={row['p95_ms']:8.2f}ms p99={row['p99_ms']:8.2f}ms errors={row['errors']}"
+        )
+        base = (baseline or {}).get("handlers", {}).get(kind)
+        if base and base["p95_ms"]:
+            change = (row["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+            line += f"  p95 {change:+.1f}% vs baseline"
+        print(line)
+    if baseline and baseline.get("throughput"):
+        change = (result["throughput"] - baseline["throughput"]) / baseline["throughput"] * 100
+        print(f"throughput {change:+.1f}% vs baseline")
+
+
+def _parse_mix(value: str) -> dict:
+    """Parse ``handle_username=6,menu=3,inline_query=1`` into weights."""
+    mix = dict.fromkeys(HANDLERS, 0.0)
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in mix:
+            raise argparse.ArgumentTypeError(f"unknown handler {name!r}")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=5, help="seconds of traffic")
+    parser.add_argument("--rate", type=float, default=200, help="updates per second")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix(
+        "handle_username=6,menu=3,inline_query=1"))
+    parser.add_argument("--hit-ratio", type=float, default=0.8)
+    parser.add_argument("--hot-users", type=int, default=50)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--instagram-latency", type=float, default=0.2)
+    parser.add_argument("--instagram-rate-limit", type=float, default=1000)
+    parser.add_argument("--error-rate", type=float, default=0.01, help="probability of HTTP 429")
+    parser.add_argument("--telegram-latency", type=float, default=0.01)
+    parser.add_argument("--inline-debounce", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a previously saved JSON file")
+    args = parser.parse_args(argv)
+
+    fault = SimpleNamespace(latency=args.instagram_latency, error_rate=args.error_rate)
+    bot = _import_bot(args, fault)
+    result = asyncio.run(_run(bot, args, fault))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    _print_report(result, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
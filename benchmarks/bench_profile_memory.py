@@ -0,0 +1,64 @@
+"""Memory benchmark: bytes per cached profile, nested dicts vs ``ProfileRecord``.
+
+Fills a ``ProfileCache`` with ``ENTRIES`` synthetic profiles stored in the
+old ``{"data": {"user": {...}}}`` shape and then as ``ProfileRecord`` objects,
+and reports the memory allocated per entry as measured by ``tracemalloc``
+(values shared by both shapes, like the strings, are created beforehand so
+only the container overhead is compared).
+
+Run with ``python benchmarks/bench_profile_memory.py``.
+"""
+
+import gc
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from instagram import ProfileRecord  # noqa: E402
+from profile_cache import ProfileCache  # noqa: E402
+
+ENTRIES = 20_000
+
+
+def _users():
+    return [
+        {
+            "id": 10**9 + i,
+            "username": f"user{i}",
+            "full_name": f"User Number {i}",
+            "biography": f"Biography of user {i}",
+            "follower_count": 1000 + i,
+            "following_count": 100 + i,
+            "is_private": bool(i % 2),
+            "media_count": i % 500,
+            "profile_pic_url": f"https://cdn.example.invalid/{i}.jpg",
+        }
+        for i in range(ENTRIES)
+    ]
+
+
+def _measure(users, build) -> float:
+    cache = ProfileCache(ttl=3600, max_entries=ENTRIES, max_bytes=1 << 40)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for user in users:
+        cache.set(user["username"], build(user))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / ENTRIES
+
+
+def main() -> None:
+    users = _users()
+    nested = _measure(users, lambda user: {"data": {"user": dict(user)}})
+    compact = _measure(users, lambda user: ProfileRecord(**user))
+    print(f"nested dicts : {nested:8.1f} bytes/entry")
+    print(f"ProfileRecord: {compact:8.1f} bytes/entry")
+    print(f"saved        : {nested - compact:8.1f} bytes/entry ({(1 - compact / nested) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
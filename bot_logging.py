@@ -0,0 +1,165 @@
+"""Non-blocking logging: records are queued and written by a background thread."""
+
+import atexit
+import json
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
+
+# Attributes every LogRecord has; anything else was passed via ``extra=``.
+_RECORD_ATTRS = frozenset(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", (), None)).keys()
+) | {"message", "asctime", "taskName"}
+
+
+class DroppingQueueHandler(QueueHandler):
+    """``QueueHandler`` that never blocks: records are dropped when the queue is full.
+
+    The number of dropped records is kept in :attr:`dropped`.
+    """
+
+    def __init__(self, log_queue: "queue.Queue") -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line.
+
+    Values passed through ``extra=`` (e.g. ``duration_ms``) become top-level
+    keys so the log can be analysed with standard JSON tools.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SizedTimedRotatingFileHandler(RotatingFileHandler):
+    """Rotate when the file exceeds ``max_bytes`` or every ``interval`` seconds.
+
+    Backups are numbered like :class:`RotatingFileHandler`'s (``bot.log.1``,
+    ``bot.log.2``, ...), so ``backup_count`` bounds the disk usage whichever
+    condition triggered the rollover. A zero ``max_bytes`` or ``interval``
+    disables that condition.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        max_bytes: int = 0,
+        interval: float = 0,
+        backup_count: int = 0,
+        encoding: Optional[str] = "utf-8",
+    ) -> None:
+        super().__init__(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding
+        )
+        self.interval = interval
+        self.rollover_at = time.time() + interval if interval > 0 else None
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        if self.rollover_at is not None:
+            self.rollover_at = time.time() + self.interval
+
+
+class LoggingPipeline:
+    """Owns the queue handler installed on the root logger and its listener thread."""
+
+    def __init__(self, handler: DroppingQueueHandler, listener: QueueListener) -> None:
+        self.handler = handler
+        self.listener = listener
+        self._stopped = False
+
+    def stop(self) -> None:
+        """Flush queued records and stop the listener thread."""
+        if self._stopped:
+            return
+        self._stopped = True
+        self.listener.stop()
+        if self.handler.dropped:
+            # The listener is gone; write the final notice synchronously.
+            record = logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0,
+                "Dropped %d log records because the log queue was full",
+                (self.handler.dropped,), None,
+            )
+            for handler in self.listener.handlers:
+                handler.handle(record)
+        for handler in self.listener.handlers:
+            handler.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.handler.queue.qsize(),
+            "dropped": self.handler.dropped,
+        }
+
+
+def setup_logging(
+    level: int = logging.INFO,
+    fmt: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    path: Optional[str] = "bot.log",
+    max_bytes: int = 0,
+    rotate_interval: float = 0,
+    backup_count: int = 0,
+    json_lines: bool = False,
+    queue_size: int = 10_000,
+    stream: bool = True,
+) -> LoggingPipeline:
+    """Route all logging through a bounded queue drained by a background thread.
+
+    Log calls on the event loop only enqueue the record; formatting and
+    I/O happen on the listener thread. ``path`` enables a rotating log file
+    (``json_lines`` switches it to JSON lines); ``stream`` also logs to
+    stderr. The pipeline is stopped at interpreter exit.
+    """
+    handlers: List[logging.Handler] = []
+    if stream:
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter(fmt))
+        handlers.append(console)
+    if path:
+        file_handler = SizedTimedRotatingFileHandler(
+            path, max_bytes=max_bytes, interval=rotate_interval, backup_count=backup_count
+        )
+        file_handler.setFormatter(JsonFormatter() if json_lines else logging.Formatter(fmt))
+        handlers.append(file_handler)
+
+    handler = DroppingQueueHandler(queue.Queue(queue_size))
+    listener = QueueListener(handler.queue, *handlers, respect_handler_level=True)
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+        old.close()
+    root.addHandler(handler)
+    root.setLevel(level)
+    listener.start()
+
+    pipeline = LoggingPipeline(handler, listener)
+    atexit.register(pipeline.stop)
+    return pipeline
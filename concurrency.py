@@ -0,0 +1,246 @@
+"""Asyncio helpers that bound and deduplicate concurrent Instagram work."""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+from telegram.ext import BaseUpdateProcessor
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share the same key into one execution.
+
+    The first caller for ``key`` starts ``func`` as a task; every caller that
+    arrives while that task is still running awaits the same task and receives
+    its result (or exception). Cancelling one waiter does not cancel the shared
+    task for the others.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, "asyncio.Future"] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = self._start(key, func)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def start(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> bool:
+        """Start ``func`` in the background unless ``key`` is already running.
+
+        Returns whether a new task was started. Later :meth:`do` calls for
+        the same key join the background task.
+        """
+        if key in self._calls:
+            return False
+        self._start(key, func)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+        }
+
+    def _start(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> "asyncio.Future":
+        task = asyncio.ensure_future(func())
+        self._calls[key] = task
+        task.add_done_callback(lambda t, key=key: self._done(key, t))
+        self.executed += 1
+        return task
+
+    def _done(self, key: Hashable, task: "asyncio.Future") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter went away.
+            task.exception()
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when a :class:`BoundedExecutor` has no room for more work."""
+
+
+class BoundedExecutor:
+    """Dedicated thread pool with a bounded backlog of queued calls.
+
+    At most ``workers`` calls run at once and at most ``max_queue`` more may
+    wait for a free worker. Further submissions fail fast with
+    :class:`ExecutorBusy` instead of piling up without limit.
+
+    ``observer``, if given, is called from the worker thread with the queue
+    wait and run time (in seconds) of every completed call.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        name: str = "fetch",
+        observer: Optional[Callable[[float, float], None]] = None,
+    ) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.observer = observer
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.run_time_total = 0.0
+        self.run_time_max = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of accepted calls still waiting for a worker."""
+        return self._pending - self._running
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusy(f"{self._pending} calls already pending")
+            self._pending += 1
+            self.submitted += 1
+        queued_at = time.perf_counter()
+
+        def call() -> T:
+            started = time.perf_counter()
+            with self._lock:
+                self._running += 1
+            try:
+                return func(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+                    self.completed += 1
+                    self._record(started - queued_at, finished - started)
+                if self.observer is not None:
+                    self.observer(started - queued_at, finished - started)
+
+        try:
+            future = self._pool.submit(call)
+        except BaseException:
+            self._forget()
+            raise
+        # A call cancelled before it started never runs its ``finally``.
+        future.add_done_callback(lambda f: self._forget() if f.cancelled() else None)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self._pending - self._running,
+                "running": self._running,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "wait_time_total": self.wait_time_total,
+                "wait_time_max": self.wait_time_max,
+                "run_time_total": self.run_time_total,
+                "run_time_max": self.run_time_max,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._pool.shutdown(wait=wait)
+
+    def _forget(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _record(self, waited: float, ran: float) -> None:
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        self.run_time_total += ran
+        self.run_time_max = max(self.run_time_max, ran)
+
+
+def _chat_key(update: object) -> Optional[int]:
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None:
+        return chat.id
+    user = getattr(update, "effective_user", None)
+    return user.id if user is not None else None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Process updates concurrently while keeping each chat's updates in order.
+
+    Up to ``concurrency`` handlers run at once, but an update only starts
+    after every earlier update from the same chat (or user, for updates
+    without a chat) has finished. Updates waiting for their chat do not
+    occupy a concurrency slot, so one busy chat cannot starve the others.
+    PTB's own limit (``max_concurrent_updates``) is used as the cap on
+    pending updates, i.e. running plus waiting.
+    """
+
+    __slots__ = ("concurrency", "_slots", "_running", "_chat_locks")
+
+    def __init__(self, concurrency: int, max_pending_updates: int = 4096) -> None:
+        if concurrency < 1:
+            raise ValueError("`concurrency` must be a positive integer!")
+        super().__init__(max(max_pending_updates, concurrency))
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        self._running = 0
+        # chat id -> [lock, number of updates holding or waiting for it]
+        self._chat_locks: Dict[int, List[Any]] = {}
+
+    @property
+    def running_updates(self) -> int:
+        return self._running
+
+    @property
+    def active_chats(self) -> int:
+        return len(self._chat_locks)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = _chat_key(update)
+        if key is None:
+            await self._run(coroutine)
+            return
+        entry = self._chat_locks.get(key)
+        if entry is None:
+            entry = self._chat_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._run(coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        async with self._slots:
+            self._running += 1
+            try:
+                await coroutine
+            finally:
+                self._running -= 1
@@ -0,0 +1,72 @@
+"""HTTP/1.1 request parsing and response writing shared by the built-in servers."""
+
+import asyncio
+from typing import Optional, Tuple
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+}
+
+Request = Tuple[str, str, dict, Optional[bytes]]
+
+
+async def read_request(
+    reader: asyncio.StreamReader,
+    timeout: float,
+    max_headers: int,
+    max_body_size: int,
+) -> Optional[Request]:
+    """Read one request as ``(method, target, headers, body)``.
+
+    Returns ``None`` when the client closed the connection before sending a
+    request line. Header names are lower-cased; the body is ``None`` when it
+    exceeds ``max_body_size``, in which case ``headers["connection"]`` is set
+    to ``close`` because the unread body cannot be skipped. Line length is
+    limited by the ``StreamReader``'s own limit.
+
+    Raises ``asyncio.TimeoutError`` when any read takes longer than
+    ``timeout`` seconds and ``ValueError`` for malformed or overlong lines
+    or more than ``max_headers`` headers.
+    """
+    line = await asyncio.wait_for(reader.readline(), timeout)
+    if not line:
+        return None
+    method, target, _ = line.decode("latin-1").split(" ", 2)
+    headers = {}
+    for _ in range(max_headers + 1):
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise ValueError("too many headers")
+    length = int(headers.get("content-length", "0"))
+    if length > max_body_size:
+        headers["connection"] = "close"
+        return method, target, headers, None
+    body = await asyncio.wait_for(reader.readexactly(length), timeout) if length else b""
+    return method, target, headers, body
+
+
+def write_response(
+    writer: asyncio.StreamWriter,
+    status: int,
+    payload: bytes,
+    keep_alive: bool,
+    content_type: str = "text/plain; charset=utf-8",
+    head: bool = False,
+) -> None:
+    """Write a response; ``head`` sends the headers of ``payload`` without it."""
+    lines = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Length: {len(payload)}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(lines.encode("latin-1") + (b"" if head else payload))
@@ -0,0 +1,359 @@
+"""Helpers that manage access to Instagram through Instaloader."""
+
+import re
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+# Letters, digits, "_" and "."; at most 30 characters; no leading, trailing
+# or doubled ".".
+USERNAME_RE = re.compile(r"^(?!\.)(?!.*\.\.)(?!.*\.$)[a-z0-9._]{1,30}$")
+_PROFILE_URL_RE = re.compile(
+    r"^(?:https?://)?(?:(?:www|m)\.)?(?:instagram\.com|instagr\.am)/(?:stories/)?([^/?#]*)",
+    re.IGNORECASE,
+)
+# First path segments of instagram.com URLs that are not profiles.
+_RESERVED_PATHS = frozenset(
+    {"p", "reel", "reels", "tv", "explore", "accounts", "direct", "stories", "about", "legal"}
+)
+
+
+def normalize_username(text: str) -> Optional[str]:
+    """Return the canonical (lower-case) username in ``text``, or ``None``.
+
+    Accepts ``username``, ``@username`` and profile links such as
+    ``https://www.instagram.com/username/?hl=en``. Anything that cannot be a
+    valid Instagram username yields ``None`` so it can be rejected without a
+    network call.
+    """
+    candidate = text.strip()
+    match = _PROFILE_URL_RE.match(candidate)
+    if match:
+        candidate = match.group(1)
+        if candidate.lower() in _RESERVED_PATHS:
+            return None
+    candidate = candidate.lstrip("@").lower()
+    return candidate if USERNAME_RE.match(candidate) else None
+
+
+class ProfileRecord:
+    """Immutable, compact result of a successful profile lookup.
+
+    One slotted object replaces the ``{"data": {"user": {...}}}`` nested
+    dicts, and usernames are interned so repeated lookups share one string.
+    For existing callers the record still reads like both of those dicts:
+    ``record["data"]["user"] is record``, ``record.get("error")`` is ``None``
+    and fields are available as ``record["full_name"]`` or
+    ``record.get("full_name")``. :meth:`as_dict` returns the plain dict shape.
+    """
+
+    FIELDS = (
+        "id",
+        "username",
+        "full_name",
+        "biography",
+        "follower_count",
+        "following_count",
+        "is_private",
+        "media_count",
+        "profile_pic_url",
+    )
+    __slots__ = FIELDS
+
+    def __init__(self, **fields: Any) -> None:
+        for name in self.FIELDS:
+            value = fields.get(name)
+            if name == "username" and isinstance(value, str):
+                value = sys.intern(value)
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_profile(cls, profile: Any) -> "ProfileRecord":
+        """Build a record from an ``instaloader.Profile``."""
+        return cls(
+            id=profile.userid,
+            username=profile.username,
+            full_name=profile.full_name,
+            biography=profile.biography,
+            follower_count=profile.followers,
+            following_count=profile.followees,
+            is_private=profile.is_private,
+            media_count=profile.mediacount,
+            profile_pic_url=profile.profile_pic_url,
+        )
+
+    @classmethod
+    def from_response(cls, data: Any) -> Any:
+        """Turn a ``{"data": {"user": {...}}}`` dict into a record.
+
+        Anything else (error dicts, ``None``) is returned unchanged.
+        """
+        try:
+            user = data["data"]["user"]
+        except (KeyError, TypeError):
+            return data
+        return cls(**user) if isinstance(user, dict) else user
+
+    def as_dict(self) -> dict:
+        return {"data": {"user": {name: getattr(self, name) for name in self.FIELDS}}}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "data":
+            return {"user": self}
+        if key in self.FIELDS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ProfileRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.FIELDS)
+
+    def __hash__(self) -> int:
+        return hash(tuple(getattr(self, name) for name in self.FIELDS))
+
+    def __repr__(self) -> str:
+        return f"ProfileRecord(username={self.username!r}, id={self.id!r})"
+
+    def __reduce__(self):
+        return (_record_from_dict, (self.as_dict()["data"]["user"],))
+
+
+def _record_from_dict(fields: dict) -> ProfileRecord:
+    return ProfileRecord(**fields)
+
+
+class InstaloaderPool:
+    """Thread-safe pool of long-lived Instaloader instances.
+
+    Each Instaloader keeps its own ``requests`` session, so reusing instances
+    keeps HTTP connections alive between lookups instead of paying for a new
+    TCP/TLS handshake every time. Instances are created lazily up to ``size``
+    and are replaced after ``max_uses`` checkouts or when released as broken.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int, max_uses: int = 500) -> None:
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self._factory = factory
+        self.size = size
+        self.max_uses = max_uses
+        self._idle: List[Any] = []
+        self._uses: Dict[int, int] = {}
+        self._cond = threading.Condition()
+        self._total = 0
+        self.created = 0
+        self.recycled = 0
+
+    def acquire(self) -> Any:
+        """Check out an Instaloader, blocking while all of them are in use."""
+        with self._cond:
+            while not self._idle and self._total >= self.size:
+                self._cond.wait()
+            if self._idle:
+                loader = self._idle.pop()
+                self._uses[id(loader)] += 1
+                return loader
+            self._total += 1
+        try:
+            loader = self._factory()
+        except BaseException:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._uses[id(loader)] = 1
+            self.created += 1
+        return loader
+
+    def release(self, loader: Any, discard: bool = False) -> None:
+        """Return ``loader`` to the pool, closing it if it should be recycled."""
+        with self._cond:
+            if discard or self._uses.get(id(loader), 0) >= self.max_uses:
+                self._uses.pop(id(loader), None)
+                self._total -= 1
+                self.recycled += 1
+                close = getattr(loader, "close", None)
+            else:
+                self._idle.append(loader)
+                close = None
+            self._cond.notify()
+        if close is not None:
+            close()
+
+    def clear(self) -> None:
+        """Close and drop every idle instance."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            for loader in idle:
+                self._uses.pop(id(loader), None)
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for loader in idle:
+            close = getattr(loader, "close", None)
+            if close is not None:
+                close()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "in_use": self._total - len(self._idle),
+                "created": self.created,
+                "recycled": self.recycled,
+            }
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting outbound Instagram requests.
+
+    Tokens refill at ``rate`` per second up to ``burst``; every request
+    consumes one token.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.throttled = 0
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Reserve the next token without blocking.
+
+        Returns how many seconds the caller must wait before using it (``0``
+        if one is available now), or ``None`` when that wait would exceed
+        ``max_wait``. Reservations queue up behind each other, so concurrent
+        callers are served in order without re-polling the bucket.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                self.throttled += 1
+                return None
+            self._tokens -= 1
+            self.granted += 1
+            return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "tokens": self._tokens,
+                "granted": self.granted,
+                "throttled": self.throttled,
+            }
+
+
+class CircuitBreaker:
+    """Stop calling Instagram after repeated rate-limit or server errors.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    :meth:`allow` returns ``False`` for ``base_backoff`` seconds. Then a single
+    half-open probe is let through: success closes the breaker, failure
+    re-opens it with the backoff doubled (capped at ``max_backoff``).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        base_backoff: float = 30,
+        max_backoff: float = 600,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.last_failure: Optional[str] = None
+        self._backoff = base_backoff
+        self._open_until = 0.0
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Return whether a request may be sent to Instagram now."""
+        with self._lock:
+            if self.state == self.OPEN and self._clock() >= self._open_until:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._backoff = self.base_backoff
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """Give up a half-open probe that did not reach Instagram."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self, reason: Optional[str] = None) -> None:
+        with self._lock:
+            self.last_failure = reason
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+                self._open()
+            elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self._backoff = self.base_backoff
+                self._open()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "backoff": self._backoff,
+            }
+
+    def _open(self) -> None:
+        self.state = self.OPEN
+        self._open_until = self._clock() + self._backoff
+        self._probing = False
+        self.opened += 1
@@ -2,6 +2,7 @@
 
 import json
 from pathlib import Path
+from types import MappingProxyType
 from typing import Any
 
 from telegram.helpers import escape_markdown
@@ -26,9 +27,32 @@ def get_message(key: str, lang: str = DEFAULT_LANG, **kwargs: Any) -> str:
 
     data = _translations.get(lang) or _translations[DEFAULT_LANG]
     text = data.get(key, "")
+    if not kwargs:
+        return text
     return text.format(**kwargs)
 
 
+# MarkdownV2-escaped copies of every translation, built once at import.
+_escaped_translations = MappingProxyType(
+    {
+        lang: MappingProxyType(
+            {key: escape_markdown(text, version=2) for key, text in data.items()}
+        )
+        for lang, data in _translations.items()
+    }
+)
+
+
+def get_escaped_message(key: str, lang: str = DEFAULT_LANG) -> str:
+    """Return the static message for ``key`` already escaped for MarkdownV2.
+
+    Uses the same language fallback as :func:`get_message`.
+    """
+
+    data = _escaped_translations.get(lang) or _escaped_translations[DEFAULT_LANG]
+    return data.get(key, "")
+
+
 # Labels used for formatting profile information in different languages.
 _PROFILE_LABELS = {
     "fa": {
@@ -52,9 +76,10 @@ _PROFILE_LABELS = {
 }
 
 
-def format_profile_info(user: dict, lang: str = DEFAULT_LANG) -> str:
+def format_profile_info(user: Any, lang: str = DEFAULT_LANG) -> str:
     """Return a formatted list of user profile information.
 
+    ``user`` is an ``instagram.ProfileRecord`` or a dict with the same keys.
     All user-supplied values are escaped for safe usage with
     :class:`telegram.constants.ParseMode.MARKDOWN_V2`.
     """
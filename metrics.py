@@ -0,0 +1,272 @@
+"""Small in-process metrics registry rendered in the Prometheus text format."""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from http_request import read_request, write_response
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels[name]) for name in self.labels)
+        return self._values.get(key, 0)
+
+    def snapshot(self) -> Dict[LabelValues, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+            for key, value in sorted(self.snapshot().items())
+        ]
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values, optionally labelled."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [per-bucket counts, sum, count]
+        self._series: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall time spent in the ``with`` block, in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict[LabelValues, dict]:
+        """Return ``{label values: {"count", "sum", "buckets"}}`` with cumulative buckets."""
+        with self._lock:
+            result = {}
+            for key, (counts, total, count) in self._series.items():
+                cumulative, running = {}, 0
+                for bound, n in zip(self.buckets, counts):
+                    running += n
+                    cumulative[bound] = running
+                result[key] = {"count": count, "sum": total, "buckets": cumulative}
+            return result
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, series in sorted(self.snapshot().items()):
+            for bound, n in series["buckets"].items():
+                le = 'le="{}"'.format(_format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {n}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callback each time the metrics are collected."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, func: Callable[[], float]) -> None:
+        self.name = name
+        self.help = help
+        self.func = func
+
+    def value(self) -> float:
+        return self.func()
+
+    def render(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.value())}"]
+
+
+class MetricsRegistry:
+    """Collection of named metrics that can be rendered or read back as a dict."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, func: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, help, func))
+
+    def get(self, name: str):
+        return self._metrics[name]
+
+    def snapshot(self) -> dict:
+        """Return the current value of every metric, keyed by metric name."""
+        return {
+            name: metric.value() if isinstance(metric, Gauge) else metric.snapshot()
+            for name, metric in self._metrics.items()
+        }
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, metric in self._metrics.items():
+            try:
+                samples = metric.render()
+            except Exception:  # pragma: no cover - a broken gauge must not hide the rest
+                LOGGER.exception("Collecting metric %s failed", name)
+                continue
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name!r} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+
+class MetricsServer:
+    """Serve ``GET <path>`` with the registry's text output on a local port.
+
+    Requests are read with the same limits as the webhook server: each read
+    must finish within ``read_timeout`` seconds, lines are limited to
+    ``max_line_size`` bytes and requests to ``max_headers`` headers.
+    """
+
+    def __init__(
+        self,
+        registry: MetricsRegistry,
+        host: str = "127.0.0.1",
+        port: int = 9090,
+        path: str = "/metrics",
+        read_timeout: float = 30,
+        max_headers: int = 100,
+        max_line_size: int = 8192,
+    ) -> None:
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.path = path
+        self.read_timeout = read_timeout
+        self.max_headers = max_headers
+        self.max_line_size = max_line_size
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def sockets(self):
+        return self._server.sockets if self._server else ()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port, limit=self.max_line_size
+        )
+        LOGGER.info("Metrics available on http://%s:%s%s", self.host, self.port, self.path)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await read_request(reader, self.read_timeout, self.max_headers, 0)
+            if request is None:
+                return
+            method, target = request[:2]
+            if target.split("?", 1)[0] != self.path:
+                status, body = 404, b""
+            elif method not in ("GET", "HEAD"):
+                status, body = 405, b""
+            else:
+                status, body = 200, self.registry.render().encode()
+            write_response(
+                writer,
+                status,
+                body,
+                keep_alive=False,
+                content_type="text/plain; version=0.0.4; charset=utf-8",
+                head=method == "HEAD",
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,82 @@
+"""Track which usernames are looked up most often, with older lookups fading out."""
+
+import heapq
+import threading
+import time
+from typing import Callable, Dict, Hashable, List
+
+# Scores are stored relative to ``_epoch``; rebase before the weights overflow.
+_MAX_HALF_LIVES = 300
+
+
+class PopularityTracker:
+    """Exponentially decaying lookup counter.
+
+    Each :meth:`record` adds one to a key's score and every score halves
+    every ``half_life`` seconds, so :meth:`top` favours usernames that are
+    requested often *now* rather than ones that were popular hours ago.
+    Decay is applied lazily by weighting new hits instead of touching every
+    score. At most ``max_keys`` keys are kept; when the limit is exceeded the
+    lowest-scoring tenth is dropped.
+    """
+
+    def __init__(
+        self,
+        half_life: float = 3600,
+        max_keys: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if half_life <= 0 or max_keys < 1:
+            raise ValueError("half_life must be positive and max_keys at least 1")
+        self.half_life = half_life
+        self.max_keys = max_keys
+        self._clock = clock
+        self._epoch = clock()
+        self._scores: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.pruned = 0
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def record(self, key: Hashable, weight: float = 1.0) -> None:
+        """Count one lookup of ``key``."""
+        with self._lock:
+            age = self._age(self._clock())
+            if age > _MAX_HALF_LIVES:
+                self._rebase(age)
+                age = 0.0
+            self._scores[key] = self._scores.get(key, 0.0) + weight * 2.0**age
+            self.recorded += 1
+            if len(self._scores) > self.max_keys:
+                self._prune()
+
+    def score(self, key: Hashable) -> float:
+        """Return the current (decayed) score of ``key``."""
+        with self._lock:
+            return self._scores.get(key, 0.0) * 2.0 ** -self._age(self._clock())
+
+    def top(self, k: int) -> List[Hashable]:
+        """Return up to ``k`` keys, most popular first."""
+        with self._lock:
+            return heapq.nlargest(k, self._scores, key=self._scores.__getitem__)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"keys": len(self._scores), "recorded": self.recorded, "pruned": self.pruned}
+
+    def _age(self, now: float) -> float:
+        """Half-lives elapsed since ``_epoch``."""
+        return (now - self._epoch) / self.half_life
+
+    def _rebase(self, age: float) -> None:
+        scale = 2.0**-age
+        self._scores = {key: score * scale for key, score in self._scores.items()}
+        self._epoch += age * self.half_life
+
+    def _prune(self) -> None:
+        drop = max(1, len(self._scores) // 10)
+        for key in heapq.nsmallest(drop, self._scores, key=self._scores.__getitem__):
+            del self._scores[key]
+        self.pruned += drop
@@ -0,0 +1,457 @@
+"""Bounded in-memory cache for Instagram profile lookups with optional SQLite backing."""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _approx_size(value: Any) -> int:
+    """Return a rough estimate of the memory used by ``value`` in bytes.
+
+    Containers are walked recursively so nested profile dicts are accounted
+    for; the result is only used to enforce the cache's byte budget.
+    """
+
+    size = sys.getsizeof(value)
+    slots = getattr(type(value), "__slots__", None)
+    if isinstance(slots, tuple) and not isinstance(value, tuple):
+        for name in slots:
+            size += _approx_size(getattr(value, name, None))
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            size += _approx_size(key) + _approx_size(item)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += _approx_size(item)
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "stored_at", "expires_at", "retain_until", "size", "negative")
+
+    def __init__(
+        self,
+        value: Any,
+        stored_at: float,
+        expires_at: float,
+        retain_until: float,
+        size: int,
+        negative: bool,
+    ) -> None:
+        self.value = value
+        self.stored_at = stored_at
+        self.expires_at = expires_at
+        self.retain_until = retain_until
+        self.size = size
+        self.negative = negative
+
+
+class ProfileCache:
+    """Thread-safe LRU cache with per-entry TTL and entry/byte limits.
+
+    Expired entries are dropped lazily when they are looked up and, at most
+    once every ``purge_interval`` seconds, by a sweep triggered from
+    :meth:`set`. When either ``max_entries`` or ``max_bytes`` is exceeded the
+    least recently used entries are evicted.
+
+    Entries stored with ``negative=True`` (cached lookup failures) share the
+    same storage but their hits are counted separately.
+
+    Positive entries are kept for ``stale_ttl`` seconds past their expiry so
+    that :meth:`get_stale` can still serve them, e.g. while a refresh is
+    running or when Instagram is failing.
+
+    An optional ``backend`` (see :class:`SQLiteCache`) acts as a second,
+    persistent layer: writes go to both layers and memory misses are looked
+    up in the backend and promoted into memory. Code running on an event
+    loop should use the ``a``-prefixed coroutines (:meth:`aget` and so on),
+    which answer from memory directly and do backend I/O in a worker thread.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int = 10_000,
+        max_bytes: int = 32 * 1024 * 1024,
+        purge_interval: float = 60,
+        stale_ttl: float = 0,
+        backend: Optional["SQLiteCache"] = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl = ttl
+        self.backend = backend
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.purge_interval = purge_interval
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._last_purge = clock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.backend_loads = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def current_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for ``key`` or ``default`` when missing/expired."""
+        now = self._clock()
+        return self._fresh(key, self._find(key, now), now, default)
+
+    async def aget(self, key: Hashable, default: Any = None) -> Any:
+        """Coroutine version of :meth:`get` that never blocks on the backend."""
+        now = self._clock()
+        entry = self._find(key, now, local=True)
+        if entry is None and self.backend is not None:
+            return await asyncio.to_thread(self.get, key, default)
+        return self._fresh(key, entry, now, default)
+
+    def _fresh(self, key: Hashable, entry: Optional[_Entry], now: float, default: Any) -> Any:
+        with self._lock:
+            if entry is None or entry.expires_at <= now:
+                self.misses += 1
+                return default
+            if key in self._data:
+                self._data.move_to_end(key)
+            self.hits += 1
+            if entry.negative:
+                self.negative_hits += 1
+            return entry.value
+
+    def get_stale(self, key: Hashable, max_stale: float, default: Any = None) -> Any:
+        """Return a positive entry that expired at most ``max_stale`` seconds ago.
+
+        Fresh entries are not returned; use :meth:`get` for those.
+        """
+        now = self._clock()
+        return self._stale(self._find(key, now), now, max_stale, default)
+
+    async def aget_stale(self, key: Hashable, max_stale: float, default: Any = None) -> Any:
+        """Coroutine version of :meth:`get_stale` that never blocks on the backend."""
+        now = self._clock()
+        entry = self._find(key, now, local=True)
+        if entry is None and self.backend is not None:
+            return await asyncio.to_thread(self.get_stale, key, max_stale, default)
+        return self._stale(entry, now, max_stale, default)
+
+    def _stale(self, entry: Optional[_Entry], now: float, max_stale: float, default: Any) -> Any:
+        if (
+            entry is None
+            or entry.negative
+            or not entry.expires_at <= now < entry.expires_at + max_stale
+        ):
+            return default
+        with self._lock:
+            self.stale_hits += 1
+        return entry.value
+
+    def expires_in(self, key: Hashable) -> Optional[float]:
+        """Return seconds until the positive entry for ``key`` expires.
+
+        The result is negative for entries already past their TTL but still
+        kept for stale serving, and ``None`` when there is no positive entry.
+        Unlike :meth:`get` this does not touch the LRU order or the counters.
+        """
+        now = self._clock()
+        entry = self._find(key, now)
+        if entry is None or entry.negative:
+            return None
+        return entry.expires_at - now
+
+    async def aexpires_in(self, key: Hashable) -> Optional[float]:
+        """Coroutine version of :meth:`expires_in` that never blocks on the backend."""
+        now = self._clock()
+        entry = self._find(key, now, local=True)
+        if entry is None and self.backend is not None:
+            return await asyncio.to_thread(self.expires_in, key)
+        if entry is None or entry.negative:
+            return None
+        return entry.expires_at - now
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        negative: bool = False,
+    ) -> None:
+        """Store ``value`` under ``key`` for ``ttl`` seconds (default: ``self.ttl``).
+
+        A non-positive ``ttl`` stores nothing and keeps any existing entry, so
+        a transient failure does not wipe out data that may still be served
+        stale.
+        """
+        now = self._clock()
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            purge_due = now - self._last_purge >= self.purge_interval
+            if purge_due:
+                self._purge_expired(now)
+        if purge_due and self.backend is not None:
+            self.backend.purge_expired(now)
+        if ttl <= 0:
+            return
+        retain_until = now + ttl + (0 if negative else self.stale_ttl)
+        entry = _Entry(value, now, now + ttl, retain_until, 0, negative)
+        with self._lock:
+            self._insert(key, entry)
+        if self.backend is not None:
+            self.backend.store(key, entry)
+
+    async def aset(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        negative: bool = False,
+    ) -> None:
+        """Coroutine version of :meth:`set`; backend writes and sweeps run in a thread."""
+        if self.backend is None:
+            self.set(key, value, ttl, negative)
+        else:
+            await asyncio.to_thread(self.set, key, value, ttl, negative)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    async def apop(self, key: Hashable) -> None:
+        """Coroutine version of :meth:`pop`; the backend delete runs in a thread."""
+        if self.backend is None:
+            self.pop(key)
+        else:
+            await asyncio.to_thread(self.pop, key)
+
+    def purge_expired(self) -> int:
+        """Drop every entry past its stale window and return how many were removed."""
+        now = self._clock()
+        with self._lock:
+            removed = self._purge_expired(now)
+        if self.backend is not None:
+            removed += self.backend.purge_expired(now)
+        return removed
+
+    def clear(self) -> None:
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.hits = self.negative_hits = self.stale_hits = self.misses = 0
+            self.evictions = self.expirations = self.backend_loads = 0
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "positive_hits": self.hits - self.negative_hits,
+                "negative_hits": self.negative_hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "backend_loads": self.backend_loads,
+            }
+
+    def _find(self, key: Hashable, now: float, local: bool = False) -> Optional[_Entry]:
+        """Return the entry for ``key`` from memory, falling back to the backend.
+
+        With ``local`` set only memory is consulted.
+        """
+        with self._lock:
+            entry = self._lookup(key, now)
+        if entry is None and self.backend is not None and not local:
+            entry = self.backend.load(key, now)
+            if entry is not None:
+                with self._lock:
+                    self.backend_loads += 1
+                    self._insert(key, entry)
+        return entry
+
+    def _insert(self, key: Hashable, entry: _Entry) -> None:
+        if key in self._data:
+            self._remove(key)
+        entry.size = _approx_size(key) + _approx_size(entry.value)
+        if entry.size > self.max_bytes:
+            return
+        self._data[key] = entry
+        self._bytes += entry.size
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _lookup(self, key: Hashable, now: float) -> Optional[_Entry]:
+        entry = self._data.get(key)
+        if entry is not None and entry.retain_until <= now:
+            self._remove(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._data.pop(key)
+        self._bytes -= entry.size
+
+    def _purge_expired(self, now: float) -> int:
+        self._last_purge = now
+        expired = [key for key, entry in self._data.items() if entry.retain_until <= now]
+        for key in expired:
+            self._remove(key)
+        self.expirations += len(expired)
+        return len(expired)
+
+
+def _encode(value: Any) -> Any:
+    as_dict = getattr(value, "as_dict", None)
+    if as_dict is None:
+        raise TypeError(f"{type(value).__name__} is not JSON serializable")
+    return as_dict()
+
+
+class SQLiteCache:
+    """Persistent cache layer stored in SQLite, shareable between processes.
+
+    The database runs in WAL mode so several bot processes can read while one
+    writes. Each thread uses its own connection. Values must be
+    JSON-serialisable or provide an ``as_dict()`` method; ``decode``, if
+    given, is applied to every value read back (e.g. to rebuild such
+    objects). Expired rows are deleted in batches of ``batch_size``.
+    Database errors are logged and treated as cache misses. Several caches
+    can share one database file by using different ``table`` names.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        table: str = "profile_cache",
+        batch_size: int = 500,
+        timeout: float = 5,
+        decode: Optional[Callable[[Any], Any]] = None,
+    ) -> None:
+        if not table.isidentifier():
+            raise ValueError(f"invalid table name: {table!r}")
+        self.path = path
+        self.table = table
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.decode = decode
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " negative INTEGER NOT NULL,"
+                " stored_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " retain_until REAL NOT NULL)"
+            )
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_retain_until"
+                f" ON {self.table} (retain_until)"
+            )
+
+    def load(self, key: Hashable, now: float) -> Optional[_Entry]:
+        try:
+            row = self._conn().execute(
+                "SELECT value, stored_at, expires_at, retain_until, negative"
+                f" FROM {self.table} WHERE key = ? AND retain_until > ?",
+                (str(key), now),
+            ).fetchone()
+        except sqlite3.Error as err:
+            LOGGER.warning("Profile cache read failed for %s: %s", key, err)
+            return None
+        if row is None:
+            return None
+        value, stored_at, expires_at, retain_until, negative = row
+        value = json.loads(value)
+        if self.decode is not None:
+            value = self.decode(value)
+        return _Entry(value, stored_at, expires_at, retain_until, 0, bool(negative))
+
+    def store(self, key: Hashable, entry: _Entry) -> None:
+        try:
+            self._write(
+                f"INSERT OR REPLACE INTO {self.table}"
+                " (key, value, negative, stored_at, expires_at, retain_until)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    str(key),
+                    json.dumps(entry.value, ensure_ascii=False, default=_encode),
+                    int(entry.negative),
+                    entry.stored_at,
+                    entry.expires_at,
+                    entry.retain_until,
+                ),
+            )
+        except sqlite3.Error as err:
+            LOGGER.warning("Profile cache write failed for %s: %s", key, err)
+
+    def delete(self, key: Hashable) -> None:
+        try:
+            self._write(f"DELETE FROM {self.table} WHERE key = ?", (str(key),))
+        except sqlite3.Error as err:
+            LOGGER.warning("Profile cache delete failed for %s: %s", key, err)
+
+    def purge_expired(self, now: float) -> int:
+        """Delete expired rows in small batches to keep write locks short."""
+        removed = 0
+        try:
+            while True:
+                count = self._write(
+                    f"DELETE FROM {self.table} WHERE rowid IN ("
+                    f" SELECT rowid FROM {self.table} WHERE retain_until <= ? LIMIT ?)",
+                    (now, self.batch_size),
+                )
+                removed += count
+                if count < self.batch_size:
+                    return removed
+        except sqlite3.Error as err:
+            LOGGER.warning("Profile cache sweep failed: %s", err)
+            return removed
+
+    def clear(self) -> None:
+        self._write(f"DELETE FROM {self.table}")
+
+    def __len__(self) -> int:
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _write(self, sql: str, params: tuple = ()) -> int:
+        with self._conn() as conn:
+            return conn.execute(sql, params).rowcount
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -1,12 +1,18 @@
 import os
 import logging
 import asyncio
-import time
+import functools
+import hashlib
+import math
+from types import MappingProxyType
+from contextlib import contextmanager
 from typing import Optional
-import re
+from urllib.parse import urlsplit
+import time
 
 import instaloader
 from telegram import (
+    InlineQueryResultCachedPhoto,
     InlineQueryResultPhoto,
     Update,
     KeyboardButton,
@@ -15,30 +21,78 @@ from telegram import (
 )
 from telegram.constants import ParseMode
 from telegram.constants import ChatAction
+from telegram.error import BadRequest
 from telegram.helpers import escape_markdown
 from telegram.ext import (
+    Application,
     ApplicationBuilder,
     CommandHandler,
     ContextTypes,
     InlineQueryHandler,
     MessageHandler,
+    TypeHandler,
     filters,
 )
 
+import bot_logging
+import batch
 import messages
+import metrics
+import user_store
+import webhook
+from concurrency import (
+    BoundedExecutor,
+    ChatOrderedUpdateProcessor,
+    ExecutorBusy,
+    SingleFlight,
+)
+from instagram import (
+    CircuitBreaker,
+    InstaloaderPool,
+    ProfileRecord,
+    TokenBucket,
+    normalize_username,
+)
+from popularity import PopularityTracker
+from profile_cache import ProfileCache, SQLiteCache
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-logging.basicConfig(
+LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_INTERVAL = float(os.getenv("LOG_ROTATE_INTERVAL", "86400"))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "7"))
+LOG_JSON = os.getenv("LOG_JSON", "").lower() in ("1", "true", "yes")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+_LOGGING = bot_logging.setup_logging(
     level=getattr(logging, LOG_LEVEL, logging.INFO),
-    format=LOG_FORMAT,
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("bot.log", encoding="utf-8"),
-    ],
+    fmt=LOG_FORMAT,
+    path=LOG_FILE or None,
+    max_bytes=LOG_MAX_BYTES,
+    rotate_interval=LOG_ROTATE_INTERVAL,
+    backup_count=LOG_BACKUP_COUNT,
+    json_lines=LOG_JSON,
+    queue_size=LOG_QUEUE_SIZE,
 )
 LOGGER = logging.getLogger(__name__)
 
+_METRICS = metrics.MetricsRegistry()
+_STAGE_SECONDS = _METRICS.histogram(
+    "instaidbot_stage_duration_seconds",
+    "Time spent in each stage of a username lookup.",
+    labels=("stage",),
+)
+_CACHE_LOOKUPS = _METRICS.counter(
+    "instaidbot_cache_lookups_total",
+    "Profile cache lookups by result (hit, miss or stale).",
+    labels=("result",),
+)
+_FETCH_OUTCOMES = _METRICS.counter(
+    "instaidbot_fetch_outcomes_total",
+    "Instagram fetch attempts by outcome.",
+    labels=("outcome",),
+)
+
 
 def _get_lang(context: ContextTypes.DEFAULT_TYPE) -> str:
     return context.user_data.get("lang", messages.DEFAULT_LANG)
@@ -47,13 +101,7 @@ def _get_lang(context: ContextTypes.DEFAULT_TYPE) -> str:
 _ALL_LANGS = list(messages._translations.keys())
 
 
-def _button_regex(key: str) -> str:
-    texts = [messages.get_message(key, lang) for lang in _ALL_LANGS]
-    pattern = "^(" + "|".join(re.escape(t) for t in texts) + ")$"
-    return pattern
-
-
-def _main_menu(lang: str = messages.DEFAULT_LANG) -> ReplyKeyboardMarkup:
+def _build_main_menu(lang: str) -> ReplyKeyboardMarkup:
     keyboard = [
         [KeyboardButton(messages.get_message("btn_start", lang))],
         [KeyboardButton(messages.get_message("btn_help", lang))],
@@ -63,14 +111,12 @@ def _main_menu(lang: str = messages.DEFAULT_LANG) -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 
-def _back_menu(lang: str = messages.DEFAULT_LANG) -> ReplyKeyboardMarkup:
+def _build_back_menu(lang: str) -> ReplyKeyboardMarkup:
     keyboard = [[KeyboardButton(messages.get_message("btn_back", lang))]]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 
-def _language_menu(
-    lang: str = messages.DEFAULT_LANG, include_back: bool = True
-) -> ReplyKeyboardMarkup:
+def _build_language_menu(lang: str, include_back: bool) -> ReplyKeyboardMarkup:
     keyboard = [
         [
             KeyboardButton(messages.get_message("btn_lang_fa", lang)),
@@ -82,19 +128,147 @@ def _language_menu(
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
 
+# Keyboards never change at runtime, so build them once per language.
+_MAIN_MENUS = MappingProxyType({lang: _build_main_menu(lang) for lang in _ALL_LANGS})
+_BACK_MENUS = MappingProxyType({lang: _build_back_menu(lang) for lang in _ALL_LANGS})
+_LANGUAGE_MENUS = MappingProxyType(
+    {
+        (lang, include_back): _build_language_menu(lang, include_back)
+        for lang in _ALL_LANGS
+        for include_back in (True, False)
+    }
+)
+
+
+def _main_menu(lang: str = messages.DEFAULT_LANG) -> ReplyKeyboardMarkup:
+    return _MAIN_MENUS.get(lang) or _MAIN_MENUS[messages.DEFAULT_LANG]
+
+
+def _back_menu(lang: str = messages.DEFAULT_LANG) -> ReplyKeyboardMarkup:
+    return _BACK_MENUS.get(lang) or _BACK_MENUS[messages.DEFAULT_LANG]
+
+
+def _language_menu(
+    lang: str = messages.DEFAULT_LANG, include_back: bool = True
+) -> ReplyKeyboardMarkup:
+    return (
+        _LANGUAGE_MENUS.get((lang, include_back))
+        or _LANGUAGE_MENUS[(messages.DEFAULT_LANG, include_back)]
+    )
+
+
 _CACHE_TTL = 300  # 5 minutes
+_CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+_CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+_CACHE_PURGE_INTERVAL = float(os.getenv("CACHE_PURGE_INTERVAL", "60"))
+_CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "")
+_STALE_WHILE_REVALIDATE = float(os.getenv("CACHE_STALE_WHILE_REVALIDATE", "600"))
+_STALE_IF_ERROR = float(os.getenv("CACHE_STALE_IF_ERROR", "3600"))
+_NOT_FOUND_CACHE_TTL = float(os.getenv("NOT_FOUND_CACHE_TTL", "600"))
+_PRIVATE_CACHE_TTL = float(os.getenv("PRIVATE_CACHE_TTL", "300"))
+_TRANSIENT_ERROR_CACHE_TTL = float(os.getenv("TRANSIENT_ERROR_CACHE_TTL", "0"))
+# TTL per error class; ``None`` is the key for connection/unknown failures.
+_ERROR_CACHE_TTLS = {
+    "not_found": _NOT_FOUND_CACHE_TTL,
+    "private": _PRIVATE_CACHE_TTL,
+    "status_429": _TRANSIENT_ERROR_CACHE_TTL,
+    "status_500": _TRANSIENT_ERROR_CACHE_TTL,
+    None: _TRANSIENT_ERROR_CACHE_TTL,
+}
+_CACHE_MISS = object()
+_FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))
+_FETCH_QUEUE_SIZE = int(os.getenv("FETCH_QUEUE_SIZE", "100"))
+_LOADER_MAX_USES = int(os.getenv("LOADER_MAX_USES", "500"))
+
+_RATE_LIMIT = float(os.getenv("INSTAGRAM_RATE_LIMIT", "1"))
+_RATE_BURST = int(os.getenv("INSTAGRAM_RATE_BURST", "5"))
+_RATE_MAX_WAIT = float(os.getenv("INSTAGRAM_RATE_MAX_WAIT", "10"))
+_BREAKER_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+_BREAKER_BACKOFF = float(os.getenv("BREAKER_BASE_BACKOFF", "30"))
+_BREAKER_MAX_BACKOFF = float(os.getenv("BREAKER_MAX_BACKOFF", "600"))
+
+_LOADER_POOL = InstaloaderPool(
+    lambda: instaloader.Instaloader(), size=_FETCH_WORKERS, max_uses=_LOADER_MAX_USES
+)
+_RATE_LIMITER = TokenBucket(_RATE_LIMIT, _RATE_BURST)
+_CIRCUIT_BREAKER = CircuitBreaker(
+    _BREAKER_THRESHOLD, _BREAKER_BACKOFF, _BREAKER_MAX_BACKOFF
+)
 
 
 def _fetch_instagram_info(username: str) -> Optional[dict]:
-    """Fetch Instagram profile data with a short-lived cache."""
-    now = time.time()
-    cached = _fetch_instagram_info._cache.get(username)
-    if cached and now - cached[0] < _CACHE_TTL:
-        return cached[1]
-    L = instaloader.Instaloader()
+    """Fetch Instagram profile data and cache the result.
+
+    This blocks on Instagram and runs on the fetch executor; callers check
+    the cache first (see ``_fetch_instagram_info_async``). Failed lookups
+    are cached too, each error class with its own TTL from
+    ``_ERROR_CACHE_TTLS``. When Instagram answers 429/500, profile data that
+    expired less than ``_STALE_IF_ERROR`` seconds ago is returned instead.
+    """
+    return _store_fetched(username, _fetch_instagram_profile(username))
+
+
+def _store_fetched(username: str, data: Optional[dict]) -> Optional[dict]:
+    """Cache a fetch result and return what the caller should be answered with."""
+    cache = _fetch_instagram_info._cache
+    if data is None or data.get("error"):
+        error = data.get("error") if data else None
+        if error in ("status_429", "status_500"):
+            stale = cache.get_stale(username, _STALE_IF_ERROR, _CACHE_MISS)
+            if stale is not _CACHE_MISS:
+                LOGGER.info("Serving stale profile %s after %s", username, error)
+                return stale
+        cache.set(username, data, ttl=_ERROR_CACHE_TTLS.get(error, 0), negative=True)
+    else:
+        cache.set(username, data)
+    return data
+
+
+def _fetch_instagram_profile(username: str) -> Optional[dict]:
+    """Fetch Instagram profile data from Instagram without any caching.
+
+    The fetch must already have been admitted by ``_admit_fetch``; the
+    outcome is reported to ``_CIRCUIT_BREAKER``.
+    """
+    started = time.perf_counter()
+    data = _load_profile(username)
+    error = data.get("error") if data else None
+    elapsed = time.perf_counter() - started
+    duration_ms = round(elapsed * 1000, 1)
+    outcome = error or ("ok" if data else "failed")
+    _STAGE_SECONDS.observe(elapsed, stage="instaloader")
+    _FETCH_OUTCOMES.inc(outcome=outcome)
+    LOGGER.info(
+        "Fetched profile %s in %.1f ms",
+        username,
+        duration_ms,
+        extra={
+            "event": "fetch",
+            "username": username,
+            "duration_ms": duration_ms,
+            "outcome": outcome,
+        },
+    )
+    if error in ("status_429", "status_500"):
+        _CIRCUIT_BREAKER.record_failure(error)
+    else:
+        _CIRCUIT_BREAKER.record_success()
+    return data
+
+
+def _load_profile(username: str):
+    """Run the Instaloader lookup on a pooled instance.
+
+    Returns a :class:`ProfileRecord`, an ``{"error": ...}`` dict or ``None``.
+    """
+    L = _LOADER_POOL.acquire()
+    healthy = True
     LOGGER.debug("Fetching Instagram profile for %s", username)
     try:
         profile = instaloader.Profile.from_username(L.context, username)
+        # Profile properties may lazily hit the network, so read them while
+        # the Instaloader is still checked out and map their errors too.
+        return ProfileRecord.from_profile(profile)
     except instaloader.exceptions.ProfileNotExistsException:
         LOGGER.warning("Profile %s does not exist", username)
         return {"error": "not_found"}
@@ -102,6 +276,7 @@ def _fetch_instagram_info(username: str) -> Optional[dict]:
         LOGGER.warning("Profile %s is private", username)
         return {"error": "private"}
     except Exception as err:  # pragma: no cover - network/HTTP errors
+        healthy = False
         status = getattr(err, "status_code", None)
         if status == 429:
             LOGGER.warning("HTTP 429 for profile %s", username)
@@ -111,23 +286,93 @@ def _fetch_instagram_info(username: str) -> Optional[dict]:
             return {"error": "status_500"}
         LOGGER.error("Failed to fetch profile %s", username, exc_info=err)
         return None
-    user = {
-        "id": profile.userid,
-        "username": profile.username,
-        "full_name": profile.full_name,
-        "biography": profile.biography,
-        "follower_count": profile.followers,
-        "following_count": profile.followees,
-        "is_private": profile.is_private,
-        "media_count": profile.mediacount,
-        "profile_pic_url": profile.profile_pic_url,
-    }
-    data = {"data": {"user": user}}
-    _fetch_instagram_info._cache[username] = (now, data)
-    return data
+    finally:
+        _LOADER_POOL.release(L, discard=not healthy)
+
+
+_PROFILE_CACHE = ProfileCache(
+    ttl=_CACHE_TTL,
+    max_entries=_CACHE_MAX_ENTRIES,
+    max_bytes=_CACHE_MAX_BYTES,
+    purge_interval=_CACHE_PURGE_INTERVAL,
+    stale_ttl=max(_STALE_WHILE_REVALIDATE, _STALE_IF_ERROR),
+    backend=(
+        SQLiteCache(_CACHE_DB_PATH, decode=ProfileRecord.from_response)
+        if _CACHE_DB_PATH
+        else None
+    ),
+)
+_fetch_instagram_info._cache = _PROFILE_CACHE
+
+_PHOTO_CACHE_TTL = float(os.getenv("PHOTO_CACHE_TTL", str(30 * 24 * 3600)))
+_PHOTO_CACHE_MAX_ENTRIES = int(os.getenv("PHOTO_CACHE_MAX_ENTRIES", "50000"))
+# Telegram file_id of each profile picture already uploaded through the bot.
+_PHOTO_FILE_IDS = ProfileCache(
+    ttl=_PHOTO_CACHE_TTL,
+    max_entries=_PHOTO_CACHE_MAX_ENTRIES,
+    purge_interval=_CACHE_PURGE_INTERVAL,
+    backend=SQLiteCache(_CACHE_DB_PATH, table="photo_file_ids") if _CACHE_DB_PATH else None,
+)
 
 
-_fetch_instagram_info._cache = {}
+def _photo_key(user: dict) -> Optional[str]:
+    """Return the file_id cache key for the user's current profile picture.
+
+    Instagram CDN URLs carry expiring signatures in their query string, so
+    only the path (which changes with the picture itself) is hashed.
+    """
+    url = user.get("profile_pic_url")
+    if not url:
+        return None
+    digest = hashlib.sha1(urlsplit(url).path.encode()).hexdigest()[:16]
+    return f"{user.get('id') or user.get('username')}:{digest}"
+
+
+async def _remember_photo(key: Optional[str], message) -> None:
+    """Store the file_id Telegram assigned to the photo in ``message``."""
+    photos = getattr(message, "photo", None)
+    if key is None or not photos:
+        return
+    file_id = photos[-1].file_id
+    if isinstance(file_id, str):
+        await _PHOTO_FILE_IDS.aset(key, file_id)
+
+
+_CAPTION_RENDERS = _METRICS.counter(
+    "instaidbot_caption_renders_total",
+    "Captions rendered because no memoised copy existed, by kind.",
+    labels=("kind",),
+)
+# Rendered captions per (record, language), outside the profile cache's byte
+# budget but bounded on their own. Records compare by content, so a refreshed
+# profile gets new captions.
+_CAPTION_CACHE_SIZE = int(os.getenv("CAPTION_CACHE_SIZE", "4096"))
+
+
+@functools.lru_cache(maxsize=_CAPTION_CACHE_SIZE)
+def _render_profile_caption(user, lang: str) -> str:
+    _CAPTION_RENDERS.inc(kind="profile")
+    return messages.format_profile_info(user, lang)
+
+
+@functools.lru_cache(maxsize=_CAPTION_CACHE_SIZE)
+def _render_inline_caption(user) -> str:
+    _CAPTION_RENDERS.inc(kind="inline")
+    return f"{user.get('full_name') or ''} (@{user['username']})"
+
+
+def _profile_caption(user, lang: str) -> str:
+    """Return the MarkdownV2 profile caption, memoised per record and language."""
+    if isinstance(user, ProfileRecord):
+        return _render_profile_caption(user, lang)
+    return _render_profile_caption.__wrapped__(user, lang)
+
+
+def _inline_caption(user) -> str:
+    """Return the plain-text caption of an inline result, memoised per record."""
+    if isinstance(user, ProfileRecord):
+        return _render_inline_caption(user)
+    return _render_inline_caption.__wrapped__(user)
 
 
 def _fetch_instagram_info_cache_clear() -> None:
@@ -136,28 +381,274 @@ def _fetch_instagram_info_cache_clear() -> None:
 
 _fetch_instagram_info.cache_clear = _fetch_instagram_info_cache_clear
 
+_POPULARITY = PopularityTracker(
+    half_life=float(os.getenv("POPULARITY_HALF_LIFE", "3600")),
+    max_keys=int(os.getenv("POPULARITY_MAX_KEYS", "10000")),
+)
+_INFLIGHT_FETCHES = SingleFlight()
+_FETCH_EXECUTOR = BoundedExecutor(
+    _FETCH_WORKERS,
+    _FETCH_QUEUE_SIZE,
+    observer=lambda waited, ran: _STAGE_SECONDS.observe(waited, stage="executor_wait"),
+)
+_METRICS.gauge(
+    "instaidbot_fetches_in_flight",
+    "Distinct usernames currently being fetched.",
+    lambda: _INFLIGHT_FETCHES.in_flight(),
+)
+_METRICS.gauge(
+    "instaidbot_fetch_queue_depth",
+    "Fetches waiting for a free executor worker.",
+    lambda: _FETCH_EXECUTOR.queue_depth,
+)
+
+
+async def _fetch_instagram_info_async(username: str) -> Optional[dict]:
+    """Return cached profile data, or fetch it on the fetch executor.
+
+    The cache is checked on the event loop, so cached profiles are answered
+    even while every fetch worker is busy; only misses use the executor.
+    Callers asking for the same username while a fetch is already running
+    wait for that fetch instead of starting another Instaloader request.
+    Profiles that expired less than ``_STALE_WHILE_REVALIDATE`` seconds ago
+    are returned immediately while a background refresh updates the cache.
+    ``username`` must already be canonical (see ``normalize_username``) since
+    it is used as the cache key as is.
+    """
+    key = username
+    _POPULARITY.record(username)
+    with _STAGE_SECONDS.time(stage="cache"):
+        cached = await _PROFILE_CACHE.aget(username, _CACHE_MISS)
+    if cached is not _CACHE_MISS:
+        _CACHE_LOOKUPS.inc(result="hit")
+        return cached
+    if _STALE_WHILE_REVALIDATE > 0:
+        stale = await _PROFILE_CACHE.aget_stale(username, _STALE_WHILE_REVALIDATE, _CACHE_MISS)
+        if stale is not _CACHE_MISS:
+            _CACHE_LOOKUPS.inc(result="stale")
+            if _INFLIGHT_FETCHES.start(key, lambda: _run_fetch(username)):
+                LOGGER.debug("Refreshing stale profile %s in the background", username)
+            return stale
+    _CACHE_LOOKUPS.inc(result="miss")
+    return await _INFLIGHT_FETCHES.do(key, lambda: _run_fetch(username))
+
+
+async def _admit_fetch(username: str) -> Optional[dict]:
+    """Wait on the event loop until an Instagram request may be sent.
+
+    Returns ``None`` once the request is admitted, or the error to answer
+    with: the last failure while ``_CIRCUIT_BREAKER`` is open, or ``busy``
+    when no ``_RATE_LIMITER`` token frees up within ``_RATE_MAX_WAIT``
+    seconds. Waiting here, rather than on a fetch worker, keeps the workers
+    free for requests that are actually sent.
+    """
+    if not _CIRCUIT_BREAKER.allow():
+        LOGGER.info("Circuit open, skipping Instagram fetch for %s", username)
+        _FETCH_OUTCOMES.inc(outcome="circuit_open")
+        return {"error": _CIRCUIT_BREAKER.last_failure or "status_429"}
+    wait = _RATE_LIMITER.reserve(_RATE_MAX_WAIT)
+    if wait is None:
+        LOGGER.warning("Rate limit budget exhausted, rejecting fetch for %s", username)
+        _FETCH_OUTCOMES.inc(outcome="rate_limited")
+        _CIRCUIT_BREAKER.release_probe()
+        return {"error": "busy"}
+    if wait:
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            _CIRCUIT_BREAKER.release_probe()
+            raise
+    return None
+
+
+async def _run_fetch(username: str) -> Optional[dict]:
+    """Admit a fetch, then run ``_fetch_instagram_info`` on the fetch executor.
+
+    When the fetch is rejected by the circuit breaker, data that expired
+    less than ``_STALE_IF_ERROR`` seconds ago is returned if there is any.
+    When the executor's queue is full ``{"error": "busy"}`` is returned.
+    A fetch that raises gives up its half-open probe so the breaker can
+    let the next one through.
+    """
+    rejected = await _admit_fetch(username)
+    if rejected is not None:
+        if rejected["error"] in ("status_429", "status_500"):
+            stale = await _PROFILE_CACHE.aget_stale(username, _STALE_IF_ERROR, _CACHE_MISS)
+            if stale is not _CACHE_MISS:
+                return stale
+        return rejected
+    try:
+        return await _FETCH_EXECUTOR.run(_fetch_instagram_info, username)
+    except ExecutorBusy:
+        LOGGER.warning("Fetch queue full, rejecting lookup for %s", username)
+        _CIRCUIT_BREAKER.release_probe()
+        return {"error": "busy"}
+    except BaseException:
+        _CIRCUIT_BREAKER.release_probe()
+        raise
+
+
+_REFRESH_INTERVAL = float(os.getenv("CACHE_REFRESH_INTERVAL", "30"))
+_REFRESH_TOP_K = int(os.getenv("CACHE_REFRESH_TOP_K", "100"))
+_REFRESH_AHEAD = float(os.getenv("CACHE_REFRESH_AHEAD", "60"))
+_REFRESH_BUDGET_SHARE = float(os.getenv("CACHE_REFRESH_BUDGET_SHARE", "0.25"))
+_REFRESH_MIN_SCORE = float(os.getenv("CACHE_REFRESH_MIN_SCORE", "1"))
+_WARMUP_USERNAMES = os.getenv("CACHE_WARMUP_USERNAMES", "")
+_CACHE_REFRESHES = _METRICS.counter(
+    "instaidbot_cache_refreshes_total",
+    "Background refreshes of popular profiles by trigger and result.",
+    labels=("trigger", "result"),
+)
+# Unused refresh budget carried over between runs, in Instagram requests.
+_REFRESH_ALLOWANCE = {"requests": 0.0}
+
+
+async def _refresh(username: str, trigger: str) -> None:
+    """Re-fetch ``username`` in the background, joining any lookup already running."""
+
+    data = await _INFLIGHT_FETCHES.do(username, lambda: _run_fetch(username))
+    result = "ok" if data is not None and not data.get("error") else "failed"
+    _CACHE_REFRESHES.inc(trigger=trigger, result=result)
+
+
+async def refresh_popular_profiles(context: Optional[ContextTypes.DEFAULT_TYPE] = None) -> int:
+    """Refresh the most popular cached profiles shortly before they expire.
+
+    Runs every ``_REFRESH_INTERVAL`` seconds on the ``JobQueue``. Of the
+    ``_REFRESH_TOP_K`` most requested usernames whose decayed popularity
+    score is at least ``_REFRESH_MIN_SCORE``, those whose cached profile
+    expires within ``_REFRESH_AHEAD`` seconds (or already went stale) are
+    fetched again one at a time, using at most ``_REFRESH_BUDGET_SHARE`` of
+    the Instagram rate limit so user lookups keep the rest. Nothing is
+    refreshed while the circuit breaker is not closed. Returns the number of
+    profiles refreshed.
+    """
+    per_run = _REFRESH_BUDGET_SHARE * _RATE_LIMIT * _REFRESH_INTERVAL
+    # Carry over at most one run's worth so quiet periods do not add up to a burst.
+    allowance = min(_REFRESH_ALLOWANCE["requests"] + per_run, max(1.0, per_run))
+    refreshed = 0
+    for username in _POPULARITY.top(_REFRESH_TOP_K):
+        if _POPULARITY.score(username) < _REFRESH_MIN_SCORE:
+            break  # the rest are less popular still
+        remaining = await _PROFILE_CACHE.aexpires_in(username)
+        if remaining is None or remaining > _REFRESH_AHEAD:
+            continue
+        if allowance < 1 or _CIRCUIT_BREAKER.state != CircuitBreaker.CLOSED:
+            _CACHE_REFRESHES.inc(trigger="popular", result="deferred")
+            continue
+        allowance -= 1
+        await _refresh(username, "popular")
+        refreshed += 1
+    _REFRESH_ALLOWANCE["requests"] = allowance
+    return refreshed
+
+
+async def warm_up_cache(usernames) -> int:
+    """Load ``usernames`` into the profile cache at startup.
+
+    Each username is scored as twice ``_REFRESH_MIN_SCORE`` lookups (at
+    least one), so the refresh job keeps it warm for about one popularity
+    half-life unless users ask for it.
+    Profiles that are already cached (e.g. in ``CACHE_DB_PATH``) are skipped.
+    Returns the number of profiles fetched.
+    """
+    fetched = 0
+    for username in usernames:
+        _POPULARITY.record(username, weight=max(2 * _REFRESH_MIN_SCORE, 1.0))
+        remaining = await _PROFILE_CACHE.aexpires_in(username)
+        if remaining is not None and remaining > _REFRESH_AHEAD:
+            continue
+        await _refresh(username, "warmup")
+        fetched += 1
+    LOGGER.info("Warmed up %d of %d profiles", fetched, len(usernames))
+    return fetched
+
+
+_INVALID_USERNAMES = _METRICS.counter(
+    "instaidbot_invalid_usernames_total",
+    "Lookups rejected locally because the text is not a valid username.",
+)
+_CHAT_ACTION_DELAY = float(os.getenv("CHAT_ACTION_DELAY", "1"))
+_CHAT_ACTIONS = _METRICS.counter(
+    "instaidbot_chat_actions_total",
+    "Chat actions sent for slow replies, or skipped because the reply was fast"
+    " (menu replies always skip theirs).",
+    labels=("result",),
+)
+_BACKGROUND_TASKS = set()
+
+
+@contextmanager
+def _chat_action(update: Update, context: ContextTypes.DEFAULT_TYPE, action=ChatAction.TYPING):
+    """Show ``action`` only if the block is still running after ``_CHAT_ACTION_DELAY``.
+
+    Cache hits and other fast paths then skip the extra Bot API call, and
+    the chat action of a slow one is sent in the background without delaying
+    the reply.
+    """
+    chat = update.effective_chat
+    fired = False
+
+    def fire() -> None:
+        nonlocal fired
+        fired = True
+        _CHAT_ACTIONS.inc(result="sent")
+        task = asyncio.ensure_future(context.bot.send_chat_action(chat.id, action))
+        _BACKGROUND_TASKS.add(task)
+        task.add_done_callback(_chat_action_done)
+
+    handle = asyncio.get_running_loop().call_later(_CHAT_ACTION_DELAY, fire) if chat else None
+    try:
+        yield
+    finally:
+        if handle is not None:
+            handle.cancel()
+            if not fired:
+                _CHAT_ACTIONS.inc(result="skipped")
+
+
+def _chat_action_done(task: "asyncio.Task") -> None:
+    _BACKGROUND_TASKS.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        LOGGER.debug("Sending chat action failed: %s", task.exception())
+
+
+def _spawn(coro) -> None:
+    """Run ``coro`` as a background task that is cancelled on shutdown."""
+    task = asyncio.ensure_future(coro)
+    _BACKGROUND_TASKS.add(task)
+    task.add_done_callback(_spawned_done)
+
+
+def _spawned_done(task: "asyncio.Task") -> None:
+    _BACKGROUND_TASKS.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        LOGGER.error("Background task failed", exc_info=task.exception())
+
+
+_WELCOME_TEXT = escape_markdown(
+    "👋 به InstaIDBot خوش آمدی! این ربات اطلاعات عمومی حساب‌های اینستاگرام را می‌گیرد و به صورت خلاصه برات می‌فرسته. کافی هست نام کاربری رو بفرستی 😊",
+    version=2,
+)
+
 
 async def send_welcome_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a friendly Persian welcome message explaining the bot."""
     lang = _get_lang(context)
-    text = escape_markdown(
-        "👋 به InstaIDBot خوش آمدی! این ربات اطلاعات عمومی حساب‌های اینستاگرام را می‌گیرد و به صورت خلاصه برات می‌فرسته. کافی هست نام کاربری رو بفرستی 😊",
-        version=2,
-    )
     await update.message.reply_text(
-        text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=_main_menu(lang)
+        _WELCOME_TEXT, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=_main_menu(lang)
     )
     context.user_data["menu"] = "main"
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await context.bot.send_chat_action(update.effective_chat.id, ChatAction.TYPING)
+    _CHAT_ACTIONS.inc(result="skipped")
     if not context.user_data.get("started"):
         await send_welcome_message(update, context)
         context.user_data["started"] = True
         return
     lang = _get_lang(context)
-    text = escape_markdown(messages.get_message("start", lang), version=2)
+    text = messages.get_escaped_message("start", lang)
     await update.message.reply_text(
         text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=_main_menu(lang)
     )
@@ -165,9 +656,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await context.bot.send_chat_action(update.effective_chat.id, ChatAction.TYPING)
+    _CHAT_ACTIONS.inc(result="skipped")
     lang = _get_lang(context)
-    text = escape_markdown(messages.get_message("help", lang), version=2)
+    text = messages.get_escaped_message("help", lang)
     await update.message.reply_text(
         text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=_main_menu(lang)
     )
@@ -175,9 +666,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
 
 async def about_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await context.bot.send_chat_action(update.effective_chat.id, ChatAction.TYPING)
+    _CHAT_ACTIONS.inc(result="skipped")
     lang = _get_lang(context)
-    text = escape_markdown(messages.get_message("about", lang), version=2)
+    text = messages.get_escaped_message("about", lang)
     await update.message.reply_text(
         text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=_main_menu(lang)
     )
@@ -185,9 +676,9 @@ async def about_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 
 async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await context.bot.send_chat_action(update.effective_chat.id, ChatAction.TYPING)
+    _CHAT_ACTIONS.inc(result="skipped")
     lang = _get_lang(context)
-    text = escape_markdown(messages.get_message("language_prompt", lang), version=2)
+    text = messages.get_escaped_message("language_prompt", lang)
     context.user_data["language_prev_menu"] = context.user_data.get("menu", "main")
     await update.message.reply_text(
         text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=_language_menu(lang)
@@ -195,11 +686,9 @@ async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
 
 async def set_language(update: Update, context: ContextTypes.DEFAULT_TYPE, lang: str) -> None:
-    await context.bot.send_chat_action(update.effective_chat.id, ChatAction.TYPING)
+    _CHAT_ACTIONS.inc(result="skipped")
     context.user_data["lang"] = lang
-    text = escape_markdown(
-        messages.get_message(f"language_set_{lang}", lang), version=2
-    )
+    text = messages.get_escaped_message(f"language_set_{lang}", lang)
     prev_menu = context.user_data.pop("language_prev_menu", "back")
     markup = _main_menu(lang) if prev_menu == "main" else _back_menu(lang)
     await update.message.reply_text(
@@ -217,22 +706,33 @@ async def set_language_en(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 
 async def back_to_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await context.bot.send_chat_action(update.effective_chat.id, ChatAction.TYPING)
+    _CHAT_ACTIONS.inc(result="skipped")
     lang = _get_lang(context)
-    text = escape_markdown(messages.get_message("start", lang), version=2)
+    text = messages.get_escaped_message("start", lang)
     await update.message.reply_text(
         text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=_main_menu(lang)
     )
     context.user_data["menu"] = "main"
 
 
-async def handle_username(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await context.bot.send_chat_action(update.effective_chat.id, ChatAction.TYPING)
+async def handle_username(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, text: Optional[str] = None
+) -> None:
+    """Look up the username in the message, or ``text`` when given."""
     lang = _get_lang(context)
-    username = update.message.text.strip().lstrip("@")
-    data = await asyncio.to_thread(_fetch_instagram_info, username)
+    username = normalize_username(update.message.text if text is None else text)
+    if username is None:
+        _INVALID_USERNAMES.inc()
+        text = messages.get_escaped_message("error_invalid_username", lang)
+        await update.message.reply_text(
+            text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=_back_menu(lang)
+        )
+        context.user_data["menu"] = "back"
+        return
+    with _chat_action(update, context):
+        data = await _fetch_instagram_info_async(username)
     if data is None:
-        text = escape_markdown(messages.get_message("error_connection", lang), version=2)
+        text = messages.get_escaped_message("error_connection", lang)
         await update.message.reply_text(
             text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=_back_menu(lang)
         )
@@ -245,9 +745,10 @@ async def handle_username(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             "private": "error_private",
             "status_429": "error_429",
             "status_500": "error_500",
+            "busy": "error_busy",
         }.get(err)
         if key:
-            text = escape_markdown(messages.get_message(key, lang), version=2)
+            text = messages.get_escaped_message(key, lang)
             await update.message.reply_text(
                 text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=_back_menu(lang)
             )
@@ -256,26 +757,44 @@ async def handle_username(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     try:
         user = data["data"]["user"]
     except (KeyError, TypeError):
-        text = escape_markdown(messages.get_message("error_data", lang), version=2)
+        text = messages.get_escaped_message("error_data", lang)
         await update.message.reply_text(
             text, parse_mode=ParseMode.MARKDOWN_V2, reply_markup=_back_menu(lang)
         )
         context.user_data["menu"] = "back"
         return
     context.user_data["profile_pic_url"] = user.get("profile_pic_url")
-    text = messages.format_profile_info(user, lang)
-    caption = text
+    with _STAGE_SECONDS.time(stage="format"):
+        caption = _profile_caption(user, lang)
     photo_url = user.get("profile_pic_url")
     if photo_url:
-        await context.bot.send_chat_action(
-            update.effective_chat.id, ChatAction.UPLOAD_PHOTO
-        )
-        await update.message.reply_photo(
-            photo_url,
-            caption=caption,
-            parse_mode=ParseMode.MARKDOWN_V2,
-            reply_markup=_back_menu(lang),
-        )
+        photo_key = _photo_key(user)
+        file_id = await _PHOTO_FILE_IDS.aget(photo_key) if photo_key else None
+        sent = None
+        if file_id:
+            try:
+                with _STAGE_SECONDS.time(stage="reply_photo"):
+                    sent = await update.message.reply_photo(
+                        file_id,
+                        caption=caption,
+                        parse_mode=ParseMode.MARKDOWN_V2,
+                        reply_markup=_back_menu(lang),
+                    )
+            except BadRequest:
+                LOGGER.warning("Cached file_id for %s rejected, resending URL", photo_key)
+                await _PHOTO_FILE_IDS.apop(photo_key)
+        if sent is None:
+            # Telegram downloads the URL itself, which can take a while.
+            with _STAGE_SECONDS.time(stage="reply_photo"), _chat_action(
+                update, context, ChatAction.UPLOAD_PHOTO
+            ):
+                sent = await update.message.reply_photo(
+                    photo_url,
+                    caption=caption,
+                    parse_mode=ParseMode.MARKDOWN_V2,
+                    reply_markup=_back_menu(lang),
+                )
+            await _remember_photo(photo_key, sent)
         context.user_data["menu"] = "back"
     else:
         await update.message.reply_text(
@@ -284,30 +803,374 @@ async def handle_username(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         context.user_data["menu"] = "back"
 
 
+_BATCH_MAX_USERNAMES = int(os.getenv("BATCH_MAX_USERNAMES", "200"))
+_BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+_BATCH_INLINE_LIMIT = int(os.getenv("BATCH_INLINE_LIMIT", "20"))
+_BATCH_GROUP_SIZE = int(os.getenv("BATCH_GROUP_SIZE", "10"))
+_BATCH_PROGRESS_INTERVAL = float(os.getenv("BATCH_PROGRESS_INTERVAL", "3"))
+_BATCH_MAX_FILE_SIZE = int(os.getenv("BATCH_MAX_FILE_SIZE", str(256 * 1024)))
+_BATCH_FILE_FORMAT = os.getenv("BATCH_FILE_FORMAT", "csv").lower()
+_BATCH_BUDGET_SHARE = float(os.getenv("BATCH_BUDGET_SHARE", "0.5"))
+# Batch fetches take a token here before the shared one, so batches use at
+# most _BATCH_BUDGET_SHARE of the Instagram rate limit and single lookups
+# keep the rest.
+_BATCH_RATE_LIMITER = TokenBucket(_RATE_LIMIT * _BATCH_BUDGET_SHARE, 1)
+# Users with a batch in progress; each may run one at a time.
+_ACTIVE_BATCHES = set()
+_BATCH_LINE_KEYS = {
+    "ok": "batch_line_ok",
+    "not_found": "batch_line_not_found",
+    "private": "batch_line_private",
+}
+
+
+async def handle_batch(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    usernames: list,
+    skipped: int = 0,
+    file_format: Optional[str] = None,
+) -> None:
+    """Look up several usernames and stream the results back.
+
+    Cached profiles are answered immediately; the rest are fetched at most
+    ``_BATCH_CONCURRENCY`` at a time through the normal (rate-limited) fetch
+    path. Up to ``_BATCH_INLINE_LIMIT`` results are sent as text messages of
+    ``_BATCH_GROUP_SIZE`` lines as soon as each group is complete; larger
+    batches, or any batch with ``file_format`` set, get a single CSV/JSONL
+    file instead. A status message shows the progress meanwhile.
+
+    Handlers start it with ``_start_batch`` so a long batch does not hold
+    the chat's place in ``ChatOrderedUpdateProcessor``.
+    """
+    lang = _get_lang(context)
+    total = len(usernames)
+    as_file = file_format is not None or total > _BATCH_INLINE_LIMIT
+    text = messages.get_message("batch_started", lang, count=total)
+    if skipped:
+        text += "\n" + messages.get_message(
+            "batch_truncated", lang, limit=_BATCH_MAX_USERNAMES, skipped=skipped
+        )
+    status = await update.message.reply_text(text)
+    semaphore = asyncio.Semaphore(_BATCH_CONCURRENCY)
+
+    async def lookup(index: int, username: str):
+        data = await _PROFILE_CACHE.aget(username, _CACHE_MISS)
+        if data is _CACHE_MISS:
+            async with semaphore:
+                await asyncio.sleep(_BATCH_RATE_LIMITER.reserve(math.inf))
+                data = await _fetch_instagram_info_async(username)
+        return index, batch.result_row(username, data)
+
+    rows = [None] * total
+    lines = []
+    done = 0
+    loop = asyncio.get_running_loop()
+    next_progress = loop.time() + _BATCH_PROGRESS_INTERVAL
+    for future in asyncio.as_completed([lookup(i, name) for i, name in enumerate(usernames)]):
+        index, row = await future
+        rows[index] = row
+        done += 1
+        if not as_file:
+            key = _BATCH_LINE_KEYS.get(row["status"], "batch_line_failed")
+            lines.append(messages.get_message(key, lang, **row))
+            if len(lines) >= _BATCH_GROUP_SIZE:
+                await update.message.reply_text("\n".join(lines))
+                lines = []
+        if done < total and loop.time() >= next_progress:
+            next_progress = loop.time() + _BATCH_PROGRESS_INTERVAL
+            try:
+                await status.edit_text(
+                    messages.get_message("batch_progress", lang, done=done, total=total)
+                )
+            except BadRequest:
+                pass
+    if lines:
+        await update.message.reply_text("\n".join(lines))
+    found = sum(row["status"] == "ok" for row in rows)
+    summary = messages.get_message("batch_done", lang, found=found, total=total)
+    if as_file:
+        file_format = file_format or _BATCH_FILE_FORMAT
+        if file_format == "jsonl":
+            document = batch.to_jsonl(rows)
+        else:
+            file_format, document = "csv", batch.to_csv(rows)
+        await update.message.reply_document(
+            document,
+            filename=f"instagram_profiles.{file_format}",
+            caption=summary,
+            reply_markup=_back_menu(lang),
+        )
+    else:
+        await update.message.reply_text(summary, reply_markup=_back_menu(lang))
+    context.user_data["menu"] = "back"
+
+
+async def _start_batch(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    usernames: list,
+    skipped: int = 0,
+    file_format: Optional[str] = None,
+) -> None:
+    """Run ``handle_batch`` in the background unless the user already has one running."""
+    owner = (update.effective_user or update.effective_chat).id
+    if owner in _ACTIVE_BATCHES:
+        lang = _get_lang(context)
+        await update.message.reply_text(
+            messages.get_message("batch_running", lang), reply_markup=_back_menu(lang)
+        )
+        return
+    _ACTIVE_BATCHES.add(owner)
+
+    async def run() -> None:
+        try:
+            await handle_batch(update, context, usernames, skipped, file_format)
+        finally:
+            _ACTIVE_BATCHES.discard(owner)
+
+    _spawn(run())
+
+
+async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Run a batch lookup for the usernames listed in an uploaded text/CSV file.
+
+    The results are returned as a file; a caption containing ``jsonl``
+    selects JSON lines instead of ``_BATCH_FILE_FORMAT``.
+    """
+    lang = _get_lang(context)
+    document = update.message.document
+    if document.file_size and document.file_size > _BATCH_MAX_FILE_SIZE:
+        await update.message.reply_text(
+            messages.get_message("batch_too_large", lang), reply_markup=_back_menu(lang)
+        )
+        return
+    file = await document.get_file()
+    content = bytes(await file.download_as_bytearray()).decode("utf-8-sig", errors="replace")
+    usernames, skipped = batch.parse_usernames(
+        batch.split_document(content, document.file_name), _BATCH_MAX_USERNAMES
+    )
+    if not usernames:
+        await update.message.reply_text(
+            messages.get_message("batch_empty", lang), reply_markup=_back_menu(lang)
+        )
+        return
+    caption = (update.message.caption or "").lower()
+    file_format = "jsonl" if "jsonl" in caption else _BATCH_FILE_FORMAT
+    await _start_batch(update, context, usernames, skipped, file_format)
+
+
+async def batch_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Run a batch lookup for the usernames listed after ``/batch``."""
+    lang = _get_lang(context)
+    tokens = batch.split_text(update.message.text)[1:]
+    usernames, skipped = batch.parse_usernames(tokens, _BATCH_MAX_USERNAMES)
+    if not usernames:
+        await update.message.reply_text(
+            messages.get_message("batch_usage", lang), reply_markup=_back_menu(lang)
+        )
+    elif len(usernames) == 1:
+        await handle_username(update, context, text=usernames[0])
+    else:
+        await _start_batch(update, context, usernames, skipped)
+
+
+_INLINE_DEBOUNCE = float(os.getenv("INLINE_DEBOUNCE", "0.3"))
+_INLINE_MIN_QUERY_LENGTH = int(os.getenv("INLINE_MIN_QUERY_LENGTH", "3"))
+# Latest inline query task per Telegram user; older ones get cancelled.
+_INLINE_TASKS = {}
+_INLINE_STATS = {"rejected": 0, "superseded": 0, "answered": 0}
+
+
 async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    query = update.inline_query.query.strip().lstrip("@")
-    if not query:
+    """Answer an inline query with the profile photo of the typed username.
+
+    Telegram sends one query per keystroke, so each query waits
+    ``_INLINE_DEBOUNCE`` seconds and is cancelled as soon as the same user
+    sends a newer one. Queries that cannot be a username are answered
+    without contacting Instagram.
+    """
+    query = normalize_username(update.inline_query.query)
+    user_id = update.effective_user.id
+    task = asyncio.current_task()
+    previous = _INLINE_TASKS.get(user_id)
+    if previous is not None and previous is not task:
+        previous.cancel()
+    if query is None or len(query) < _INLINE_MIN_QUERY_LENGTH:
+        _INLINE_TASKS.pop(user_id, None)
+        _INLINE_STATS["rejected"] += 1
         await update.inline_query.answer([])
         return
-    data = _fetch_instagram_info(query)
+    _INLINE_TASKS[user_id] = task
+    try:
+        if _INLINE_DEBOUNCE > 0:
+            await asyncio.sleep(_INLINE_DEBOUNCE)
+        data = await _fetch_instagram_info_async(query)
+    except asyncio.CancelledError:
+        if _INLINE_TASKS.get(user_id) is not task:
+            _INLINE_STATS["superseded"] += 1
+            return
+        raise
+    finally:
+        if _INLINE_TASKS.get(user_id) is task:
+            del _INLINE_TASKS[user_id]
     results = []
     if data and not data.get("error"):
         user = data["data"]["user"]
-        caption = f"{user.get('full_name', '')} (@{user['username']})"
-        results.append(
-            InlineQueryResultPhoto(
-                id=user["username"],
-                photo_url=user["profile_pic_url"],
-                thumb_url=user["profile_pic_url"],
-                caption=caption,
+        caption = _inline_caption(user)
+        photo_key = _photo_key(user)
+        file_id = await _PHOTO_FILE_IDS.aget(photo_key) if photo_key else None
+        if file_id:
+            results.append(
+                InlineQueryResultCachedPhoto(
+                    id=user["username"], photo_file_id=file_id, caption=caption
+                )
             )
-        )
+        else:
+            results.append(
+                InlineQueryResultPhoto(
+                    id=user["username"],
+                    photo_url=user["profile_pic_url"],
+                    thumbnail_url=user["profile_pic_url"],
+                    caption=caption,
+                )
+            )
+    _INLINE_STATS["answered"] += 1
     await update.inline_query.answer(results, cache_time=60)
 
 
+# Menu button label (in every language) -> handler, for O(1) text dispatch.
+_BUTTON_HANDLERS = MappingProxyType(
+    {
+        messages.get_message(key, lang): handler
+        for key, handler in (
+            ("btn_start", start),
+            ("btn_help", help_command),
+            ("btn_about", about_command),
+            ("btn_language", language_command),
+            ("btn_lang_fa", set_language_fa),
+            ("btn_lang_en", set_language_en),
+            ("btn_back", back_to_menu),
+        )
+        for lang in _ALL_LANGS
+    }
+)
+
+
+async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Dispatch a text message to its menu button handler or the username lookup.
+
+    A message listing usernames on several lines starts a batch lookup; one
+    that repeats a single username looks it up once.
+    """
+    text = update.message.text
+    handler = _BUTTON_HANDLERS.get(text)
+    if handler is None:
+        tokens = batch.split_text(text)
+        if len(tokens) > 1:
+            usernames, skipped = batch.parse_usernames(tokens, _BATCH_MAX_USERNAMES)
+            if len(usernames) == 1:
+                await handle_username(update, context, text=usernames[0])
+                return
+            if len(usernames) > 1 and "\n" in text.strip():
+                await _start_batch(update, context, usernames, skipped)
+                return
+        handler = handle_username
+    await handler(update, context)
+
+
+_USER_DB_PATH = os.getenv("USER_DB_PATH", "user_data.sqlite3")
+_USER_FLUSH_INTERVAL = float(os.getenv("USER_FLUSH_INTERVAL", "10"))
+_USER_CACHE_MAX = int(os.getenv("USER_CACHE_MAX", "50000"))
+_USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+_USER_STORE = (
+    user_store.UserStore(_USER_DB_PATH, max_users=_USER_CACHE_MAX, max_age=_USER_CACHE_TTL)
+    if _USER_DB_PATH
+    else None
+)
+
+
+async def load_user_data(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Load the sender's ``user_data`` from ``_USER_STORE`` before other handlers run.
+
+    Registered in group -1 so the SQLite read happens in a thread and the
+    handlers' ``context.user_data`` is served from memory.
+    """
+    user = update.effective_user
+    if _USER_STORE is not None and user is not None:
+        await _USER_STORE.aload(user.id)
+
+
 # ---- PTB v20+: set commands via post_init (async) ----
+_METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+_METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+_METRICS_SERVER = (
+    metrics.MetricsServer(_METRICS, _METRICS_HOST, _METRICS_PORT) if _METRICS_PORT else None
+)
+
+
+async def _refresh_loop() -> None:
+    """Fallback for ``refresh_popular_profiles`` when PTB has no ``JobQueue``."""
+    while True:
+        await asyncio.sleep(_REFRESH_INTERVAL)
+        try:
+            await refresh_popular_profiles()
+        except Exception:  # pragma: no cover - keep refreshing after a bad run
+            LOGGER.exception("Refreshing popular profiles failed")
+
+
+def _schedule_cache_maintenance(application) -> None:
+    """Start the popular-profile refresh job and the optional startup warm-up."""
+    if _REFRESH_INTERVAL > 0:
+        if application.job_queue is not None:
+            application.job_queue.run_repeating(
+                refresh_popular_profiles,
+                interval=_REFRESH_INTERVAL,
+                first=_REFRESH_INTERVAL,
+                name="refresh_popular_profiles",
+            )
+        else:
+            LOGGER.warning(
+                "JobQueue unavailable (install python-telegram-bot[job-queue]); "
+                "refreshing popular profiles from an asyncio task"
+            )
+            _spawn(_refresh_loop())
+    warmup, _ = batch.parse_usernames(batch.split_text(_WARMUP_USERNAMES), _REFRESH_TOP_K)
+    if warmup:
+        _spawn(warm_up_cache(warmup))
+
+
 async def _post_init(application):
-    await application.bot.set_my_commands([BotCommand("start", "شروع ربات")])
+    await application.bot.set_my_commands(
+        [
+            BotCommand("start", "شروع ربات"),
+            BotCommand("batch", "جستجوی چند نام کاربری"),
+        ]
+    )
+    if _USER_STORE is not None:
+        _USER_STORE.start_autoflush(_USER_FLUSH_INTERVAL)
+    if _METRICS_SERVER is not None:
+        await _METRICS_SERVER.start()
+    _schedule_cache_maintenance(application)
+
+
+async def _post_shutdown(application: Application) -> None:
+    for task in list(_BACKGROUND_TASKS):
+        task.cancel()
+    if _METRICS_SERVER is not None:
+        await _METRICS_SERVER.stop()
+    if _USER_STORE is not None:
+        await _USER_STORE.close()
+
+
+_CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "16"))
+_WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+_WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+_WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+_WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+_WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN") or None
+_WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+_WEBHOOK_READ_TIMEOUT = float(os.getenv("WEBHOOK_READ_TIMEOUT", "30"))
 
 
 def main() -> None:
@@ -315,40 +1178,52 @@ def main() -> None:
     if not token:
         raise RuntimeError("متغیر محیطی TELEGRAM_BOT_TOKEN تنظیم نشده است.")
 
-    application = (
+    builder = (
         ApplicationBuilder()
         .token(token)
+        .concurrent_updates(ChatOrderedUpdateProcessor(_CONCURRENT_UPDATES))
         .post_init(_post_init)
-        .build()
+        .post_shutdown(_post_shutdown)
     )
+    if _USER_STORE is not None:
+        builder = builder.context_types(
+            ContextTypes(context=user_store.context_type(_USER_STORE))
+        )
+    application = builder.build()
 
+    if _USER_STORE is not None:
+        application.add_handler(TypeHandler(Update, load_user_data), group=-1)
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("batch", batch_command))
+    # Non-blocking so a debounced inline query does not hold up later updates.
+    application.add_handler(InlineQueryHandler(inline_query, block=False))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
     application.add_handler(
-        MessageHandler(filters.TEXT & filters.Regex(_button_regex("btn_start")), start)
-    )
-    application.add_handler(
-        MessageHandler(filters.TEXT & filters.Regex(_button_regex("btn_help")), help_command)
-    )
-    application.add_handler(
-        MessageHandler(filters.TEXT & filters.Regex(_button_regex("btn_about")), about_command)
-    )
-    application.add_handler(
-        MessageHandler(filters.TEXT & filters.Regex(_button_regex("btn_language")), language_command)
-    )
-    application.add_handler(
-        MessageHandler(filters.TEXT & filters.Regex(_button_regex("btn_lang_fa")), set_language_fa)
-    )
-    application.add_handler(
-        MessageHandler(filters.TEXT & filters.Regex(_button_regex("btn_lang_en")), set_language_en)
-    )
-    application.add_handler(
-        MessageHandler(filters.TEXT & filters.Regex(_button_regex("btn_back")), back_to_menu)
-    )
-    application.add_handler(InlineQueryHandler(inline_query))
-    application.add_handler(
-        MessageHandler(filters.TEXT & ~filters.COMMAND, handle_username)
+        MessageHandler(
+            filters.Document.FileExtension("txt") | filters.Document.FileExtension("csv"),
+            handle_document,
+        )
     )
 
+    if _WEBHOOK_URL:
+        server = webhook.WebhookServer(
+            application,
+            path=_WEBHOOK_PATH,
+            secret_token=_WEBHOOK_SECRET_TOKEN,
+            host=_WEBHOOK_LISTEN,
+            port=_WEBHOOK_PORT,
+            read_timeout=_WEBHOOK_READ_TIMEOUT,
+        )
+        asyncio.run(
+            webhook.serve_webhook(
+                application,
+                _WEBHOOK_URL,
+                server,
+                max_connections=_WEBHOOK_MAX_CONNECTIONS,
+            )
+        )
+        return
+
     # run_polling سنکرون و بلاکینگ است و خودش event loop را مدیریت می‌کند.
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
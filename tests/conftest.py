@@ -0,0 +1,20 @@
+import sys
+
+import pytest
+
+from instagram import CircuitBreaker, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def _fresh_guards(monkeypatch):
+    """Give every test its own rate limiters and circuit breaker.
+
+    ``telegram_bot`` is looked up instead of imported because importing it
+    needs the ``instaloader`` stub that ``test_fetch_instagram_info``
+    installs.
+    """
+    telegram_bot = sys.modules.get("telegram_bot")
+    if telegram_bot is not None:
+        monkeypatch.setattr(telegram_bot, "_RATE_LIMITER", TokenBucket(1000, 1000))
+        monkeypatch.setattr(telegram_bot, "_CIRCUIT_BREAKER", CircuitBreaker())
+        monkeypatch.setattr(telegram_bot, "_BATCH_RATE_LIMITER", TokenBucket(1000, 1000))
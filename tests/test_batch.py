@@ -0,0 +1,47 @@
+import csv
+import io
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import batch  # noqa: E402
+
+
+def test_parse_usernames_dedupes_and_skips_invalid():
+    tokens = batch.split_text("@alice, bob;Alice\n not/valid  carol.x bob")
+    assert batch.parse_usernames(tokens, limit=10) == (["alice", "bob", "carol.x"], 0)
+
+
+def test_parse_usernames_reports_truncation():
+    tokens = [f"user{i}" for i in range(5)]
+    assert batch.parse_usernames(tokens, limit=3) == (["user0", "user1", "user2"], 2)
+
+
+def test_split_document_uses_username_column():
+    text = "name,username\nAlice,alice\nBob,@bob\n"
+    assert batch.split_document(text, "list.csv") == ["alice", "@bob"]
+    assert batch.split_document("alice\nbob,carol\n", "list.CSV") == ["alice", "bob"]
+    assert batch.split_document("alice bob\ncarol", "list.txt") == ["alice", "bob", "carol"]
+
+
+def test_result_rows_serialise_to_csv_and_jsonl():
+    rows = [
+        batch.result_row(
+            "alice",
+            {"data": {"user": {"id": 1, "full_name": "Alice", "follower_count": 5}}},
+        ),
+        batch.result_row("ghost", {"error": "not_found"}),
+        batch.result_row("down", None),
+    ]
+    assert [row["status"] for row in rows] == ["ok", "not_found", "failed"]
+
+    parsed = list(csv.DictReader(io.StringIO(batch.to_csv(rows).decode("utf-8-sig"))))
+    assert parsed[0]["username"] == "alice"
+    assert parsed[0]["followers"] == "5"
+    assert parsed[1]["status"] == "not_found"
+
+    lines = batch.to_jsonl(rows).decode().splitlines()
+    assert json.loads(lines[0])["full_name"] == "Alice"
+    assert len(lines) == 3
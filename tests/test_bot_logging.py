@@ -0,0 +1,77 @@
+import json
+import logging
+import queue
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bot_logging import (  # noqa: E402
+    DroppingQueueHandler,
+    JsonFormatter,
+    SizedTimedRotatingFileHandler,
+    setup_logging,
+)
+
+
+def _record(msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(2))
+    for _ in range(5):
+        handler.handle(_record())
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_json_formatter_includes_extra_fields():
+    line = JsonFormatter().format(_record(username="alice", duration_ms=12.5))
+    data = json.loads(line)
+    assert data["message"] == "hello world"
+    assert data["level"] == "INFO"
+    assert data["username"] == "alice"
+    assert data["duration_ms"] == 12.5
+    assert "args" not in data
+
+
+def test_file_rotates_by_size(tmp_path):
+    path = tmp_path / "bot.log"
+    handler = SizedTimedRotatingFileHandler(str(path), max_bytes=50, backup_count=2)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    for _ in range(10):
+        handler.handle(_record("x" * 30, ()))
+    handler.close()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["bot.log", "bot.log.1", "bot.log.2"]
+
+
+def test_file_rotates_by_time(tmp_path):
+    path = tmp_path / "bot.log"
+    handler = SizedTimedRotatingFileHandler(str(path), interval=60, backup_count=1)
+    handler.handle(_record())
+    handler.rollover_at = 0
+    handler.handle(_record())
+    handler.close()
+    assert (tmp_path / "bot.log.1").exists()
+    assert handler.rollover_at > 0
+
+
+def test_setup_logging_writes_through_listener(tmp_path):
+    root = logging.getLogger()
+    saved = root.handlers[:], root.level
+    root.handlers = []
+    path = tmp_path / "bot.log"
+    try:
+        pipeline = setup_logging(path=str(path), json_lines=True, stream=False)
+        logging.getLogger("bot").info("fetched", extra={"duration_ms": 3})
+        pipeline.stop()
+    finally:
+        root.handlers, level = saved
+        root.setLevel(level)
+    data = json.loads(path.read_text(encoding="utf-8").splitlines()[-1])
+    assert data["logger"] == "bot"
+    assert data["duration_ms"] == 3
+    assert pipeline.stats()["dropped"] == 0
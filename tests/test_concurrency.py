@@ -0,0 +1,182 @@
+import asyncio
+import sys
+import threading
+from types import SimpleNamespace
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from concurrency import (  # noqa: E402
+    BoundedExecutor,
+    ChatOrderedUpdateProcessor,
+    ExecutorBusy,
+    SingleFlight,
+)
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"data": "ok"}
+
+    async def run():
+        return await asyncio.gather(*(flight.do("user", fetch) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert results == [{"data": "ok"}] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 4}
+
+
+def test_single_flight_shares_exceptions_and_forgets_key():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("boom")
+
+    async def run():
+        return await asyncio.gather(
+            flight.do("user", fail), flight.do("user", fail), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.in_flight() == 0
+
+    async def ok():
+        return 1
+
+    assert asyncio.run(flight.do("user", ok)) == 1
+    assert flight.executed == 2
+
+
+def test_single_flight_waiter_cancellation_keeps_shared_task():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("user", fetch))
+        second = asyncio.ensure_future(flight.do("user", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_bounded_executor_rejects_when_queue_full():
+    executor = BoundedExecutor(workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def run():
+        running = asyncio.ensure_future(executor.run(release.wait, 5))
+        queued = asyncio.ensure_future(executor.run(lambda: "queued"))
+        await asyncio.sleep(0.02)
+        assert executor.queue_depth == 1
+        with pytest.raises(ExecutorBusy):
+            await executor.run(lambda: "rejected")
+        release.set()
+        return await asyncio.gather(running, queued)
+
+    try:
+        assert asyncio.run(run()) == [True, "queued"]
+    finally:
+        release.set()
+        executor.shutdown()
+    stats = executor.stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    assert stats["queue_depth"] == 0
+    assert stats["wait_time_max"] > 0
+
+
+def test_bounded_executor_releases_slot_of_cancelled_call():
+    executor = BoundedExecutor(workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def run():
+        running = asyncio.ensure_future(executor.run(release.wait, 5))
+        queued = asyncio.ensure_future(executor.run(lambda: None))
+        await asyncio.sleep(0.02)
+        queued.cancel()
+        await asyncio.sleep(0)
+        assert executor.queue_depth == 0
+        release.set()
+        await running
+
+    try:
+        asyncio.run(run())
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def _chat_update(chat_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id), effective_user=None)
+
+
+def test_chat_ordered_processor_keeps_per_chat_order():
+    processor = ChatOrderedUpdateProcessor(concurrency=8)
+    events = []
+
+    async def handler(chat_id, n, delay):
+        events.append(("start", chat_id, n))
+        await asyncio.sleep(delay)
+        events.append(("end", chat_id, n))
+
+    async def run():
+        jobs = [
+            (1, 0, 0.03),
+            (1, 1, 0.0),
+            (2, 0, 0.01),
+            (1, 2, 0.0),
+        ]
+        await asyncio.gather(
+            *(
+                processor.process_update(_chat_update(chat), handler(chat, n, delay))
+                for chat, n, delay in jobs
+            )
+        )
+
+    asyncio.run(run())
+    chat1 = [e for e in events if e[1] == 1]
+    assert chat1 == [
+        ("start", 1, 0),
+        ("end", 1, 0),
+        ("start", 1, 1),
+        ("end", 1, 1),
+        ("start", 1, 2),
+        ("end", 1, 2),
+    ]
+    # Chat 2 ran while chat 1's slow first update was still in progress.
+    assert events.index(("end", 2, 0)) < events.index(("end", 1, 0))
+    assert processor.active_chats == 0
+
+
+def test_chat_ordered_processor_limits_concurrency():
+    processor = ChatOrderedUpdateProcessor(concurrency=2)
+    peak = []
+
+    async def handler():
+        peak.append(processor.running_updates)
+        await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(
+            *(processor.process_update(_chat_update(i), handler()) for i in range(6))
+        )
+
+    asyncio.run(run())
+    assert max(peak) == 2
@@ -1,9 +1,12 @@
 """Tests for fetching Instagram info without login."""
 
 from types import ModuleType, SimpleNamespace
+import asyncio
 import sys
 from pathlib import Path
 
+import pytest
+
 
 # Create a minimal stub of the ``instaloader`` module so tests do not require
 # network access or the real package.
@@ -42,6 +45,8 @@ sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 import instaloader  # type: ignore  # noqa: E402  (stub inserted above)
 
 import telegram_bot  # noqa: E402
+from instagram import CircuitBreaker, ProfileRecord, TokenBucket  # noqa: E402
+from profile_cache import ProfileCache  # noqa: E402
 
 
 def _profile(**kwargs):
@@ -71,6 +76,7 @@ def test_fetch_instagram_info_success(monkeypatch):
     )
 
     data = telegram_bot._fetch_instagram_info("user")
+    assert isinstance(data, ProfileRecord)
     assert data["data"]["user"]["id"] == 123
     assert (
         data["data"]["user"]["profile_pic_url"] == "http://example.com/pic.jpg"
@@ -140,3 +146,221 @@ def test_fetch_instagram_info_network_error(monkeypatch):
     )
     data = telegram_bot._fetch_instagram_info("net")
     assert data is None
+
+
+def test_fetch_instagram_info_maps_errors_from_lazy_profile_properties(monkeypatch):
+    telegram_bot._fetch_instagram_info.cache_clear()
+    contexts = []
+
+    class LazyProfile:
+        userid = 1
+        username = "lazy"
+        full_name = biography = profile_pic_url = ""
+        followees = mediacount = 0
+        is_private = False
+
+        @property
+        def followers(self):
+            raise instaloader.exceptions.HTTPError(429)
+
+    def fake_from_username(context, username):
+        contexts.append(context)
+        return LazyProfile()
+
+    monkeypatch.setattr(
+        instaloader.Profile, "from_username", staticmethod(fake_from_username)
+    )
+    assert telegram_bot._fetch_instagram_info("lazy") == {"error": "status_429"}
+    telegram_bot._fetch_instagram_info("lazy")
+    assert contexts[0] is not contexts[1]  # the failing loader was discarded
+
+
+def test_fetch_instagram_info_reuses_pooled_loader(monkeypatch):
+    telegram_bot._fetch_instagram_info.cache_clear()
+    contexts = []
+
+    def fake_from_username(context, username):
+        contexts.append(context)
+        raise instaloader.exceptions.ProfileNotExistsException()
+
+    monkeypatch.setattr(
+        instaloader.Profile, "from_username", staticmethod(fake_from_username)
+    )
+    telegram_bot._fetch_instagram_info("a")
+    telegram_bot._fetch_instagram_info("b")
+    assert contexts[0] is contexts[1]
+
+
+def test_fetch_instagram_info_caches_not_found(monkeypatch):
+    telegram_bot._fetch_instagram_info.cache_clear()
+    calls = []
+
+    def fake_from_username(context, username):
+        calls.append(username)
+        raise instaloader.exceptions.ProfileNotExistsException()
+
+    monkeypatch.setattr(
+        instaloader.Profile, "from_username", staticmethod(fake_from_username)
+    )
+    for _ in range(2):
+        data = asyncio.run(telegram_bot._fetch_instagram_info_async("missing"))
+        assert data == {"error": "not_found"}
+    assert calls == ["missing"]
+    stats = telegram_bot._fetch_instagram_info._cache.stats()
+    assert stats["negative_hits"] == 1
+    assert stats["positive_hits"] == 0
+
+
+def test_fetch_instagram_info_does_not_cache_transient_errors(monkeypatch):
+    telegram_bot._fetch_instagram_info.cache_clear()
+    calls = []
+
+    def fake_429(context, username):
+        calls.append(username)
+        raise instaloader.exceptions.HTTPError(429)
+
+    monkeypatch.setattr(
+        instaloader.Profile, "from_username", staticmethod(fake_429)
+    )
+    telegram_bot._fetch_instagram_info("rate")
+    telegram_bot._fetch_instagram_info("rate")
+    assert calls == ["rate", "rate"]
+
+
+def test_fetch_instagram_info_circuit_opens_after_repeated_429(monkeypatch):
+    telegram_bot._fetch_instagram_info.cache_clear()
+    calls = []
+
+    def fake_429(context, username):
+        calls.append(username)
+        raise instaloader.exceptions.HTTPError(429)
+
+    monkeypatch.setattr(
+        instaloader.Profile, "from_username", staticmethod(fake_429)
+    )
+    for name in ("a", "b", "c", "d", "e"):
+        data = asyncio.run(telegram_bot._fetch_instagram_info_async(name))
+        assert data == {"error": "status_429"}
+    assert calls == ["a", "b", "c"]
+    assert telegram_bot._CIRCUIT_BREAKER.state == CircuitBreaker.OPEN
+
+
+def test_fetch_that_raises_releases_the_half_open_probe(monkeypatch):
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, base_backoff=10, clock=lambda: now[0])
+    monkeypatch.setattr(telegram_bot, "_CIRCUIT_BREAKER", breaker)
+    breaker.record_failure("status_429")
+    now[0] = 10
+
+    def broken_fetch(username):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", broken_fetch)
+    with pytest.raises(RuntimeError):
+        asyncio.run(telegram_bot._run_fetch("probe"))
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()  # the next lookup may probe again
+
+
+def test_fetch_instagram_info_rejects_when_rate_limited(monkeypatch):
+    telegram_bot._fetch_instagram_info.cache_clear()
+    monkeypatch.setattr(telegram_bot, "_RATE_LIMITER", TokenBucket(0.001, 1))
+    monkeypatch.setattr(telegram_bot, "_RATE_MAX_WAIT", 0)
+
+    def fake_from_username(context, username):
+        raise instaloader.exceptions.ProfileNotExistsException()
+
+    monkeypatch.setattr(
+        instaloader.Profile, "from_username", staticmethod(fake_from_username)
+    )
+    fetched = []
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", fetched.append)
+    assert asyncio.run(telegram_bot._fetch_instagram_info_async("a")) is None
+    assert asyncio.run(telegram_bot._fetch_instagram_info_async("b")) == {"error": "busy"}
+    # The rejected lookup never occupied a fetch worker.
+    assert fetched == ["a"]
+
+
+def test_fetch_waits_for_rate_limit_on_the_event_loop(monkeypatch):
+    telegram_bot._fetch_instagram_info.cache_clear()
+    monkeypatch.setattr(telegram_bot, "_RATE_LIMITER", TokenBucket(20, 1))
+    monkeypatch.setattr(telegram_bot, "_RATE_MAX_WAIT", 1)
+    fetched = []
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", fetched.append)
+
+    async def run():
+        return await asyncio.gather(
+            *(telegram_bot._fetch_instagram_info_async(name) for name in ("a", "b", "c"))
+        )
+
+    assert asyncio.run(run()) == [None, None, None]
+    assert sorted(fetched) == ["a", "b", "c"]
+    assert telegram_bot._FETCH_EXECUTOR.queue_depth == 0
+
+
+class _FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _use_cache(monkeypatch, clock):
+    cache = ProfileCache(ttl=telegram_bot._CACHE_TTL, stale_ttl=3600, clock=clock)
+    monkeypatch.setattr(telegram_bot, "_PROFILE_CACHE", cache)
+    monkeypatch.setattr(telegram_bot._fetch_instagram_info, "_cache", cache)
+    return cache
+
+
+def _set_followers(monkeypatch, followers=None, error=None):
+    def fake_from_username(context, username):
+        if error:
+            raise instaloader.exceptions.HTTPError(error)
+        return _profile(
+            userid=1,
+            username=username,
+            full_name="",
+            biography="",
+            followers=followers,
+            followees=0,
+            is_private=False,
+            mediacount=0,
+            profile_pic_url=None,
+        )
+
+    monkeypatch.setattr(
+        instaloader.Profile, "from_username", staticmethod(fake_from_username)
+    )
+
+
+def test_fetch_instagram_info_serves_stale_on_429(monkeypatch):
+    clock = _FakeClock()
+    _use_cache(monkeypatch, clock)
+    _set_followers(monkeypatch, followers=10)
+    telegram_bot._fetch_instagram_info("user")
+    clock.now += telegram_bot._CACHE_TTL + 1
+    _set_followers(monkeypatch, error=429)
+    data = telegram_bot._fetch_instagram_info("user")
+    assert data["data"]["user"]["follower_count"] == 10
+
+
+def test_fetch_async_serves_stale_while_revalidating(monkeypatch):
+    clock = _FakeClock()
+    cache = _use_cache(monkeypatch, clock)
+    _set_followers(monkeypatch, followers=10)
+    telegram_bot._fetch_instagram_info("user")
+    clock.now += telegram_bot._CACHE_TTL + 1
+    _set_followers(monkeypatch, followers=20)
+
+    async def run():
+        first = await telegram_bot._fetch_instagram_info_async("user")
+        second = await telegram_bot._fetch_instagram_info_async("user")
+        while telegram_bot._INFLIGHT_FETCHES.in_flight():
+            await asyncio.sleep(0.01)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first["data"]["user"]["follower_count"] == 10
+    assert second["data"]["user"]["follower_count"] == 10
+    assert cache.get("user")["data"]["user"]["follower_count"] == 20
@@ -0,0 +1,172 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+import asyncio
+import csv
+import io
+
+import messages
+import telegram_bot
+
+
+def _user(username):
+    return {"data": {"user": {"id": len(username), "username": username, "full_name": username}}}
+
+
+class DummyMessage(SimpleNamespace):
+    def __init__(self, text=None, document=None, caption=None):
+        super().__init__(
+            text=text,
+            document=document,
+            caption=caption,
+            reply_text=AsyncMock(return_value=SimpleNamespace(edit_text=AsyncMock())),
+            reply_document=AsyncMock(),
+            reply_photo=AsyncMock(),
+        )
+
+
+class DummyUpdate(SimpleNamespace):
+    def __init__(self, message):
+        super().__init__(
+            message=message,
+            effective_chat=SimpleNamespace(id=1),
+            effective_user=SimpleNamespace(id=1),
+        )
+
+
+class DummyContext(SimpleNamespace):
+    def __init__(self):
+        super().__init__(user_data={}, bot=SimpleNamespace(send_chat_action=AsyncMock()))
+
+
+def _sent_texts(message):
+    return [call.args[0] for call in message.reply_text.await_args_list]
+
+
+def _run(handler, message):
+    """Run ``handler`` and the batch it starts in the background."""
+
+    async def run():
+        await handler(DummyUpdate(message), DummyContext())
+        await asyncio.gather(*telegram_bot._BACKGROUND_TASKS)
+
+    asyncio.run(run())
+
+
+def test_batch_message_streams_grouped_results(monkeypatch):
+    telegram_bot._PROFILE_CACHE.clear()
+    calls = []
+
+    def fake_fetch(username):
+        calls.append(username)
+        return {"error": "not_found"} if username == "ghost" else _user(username)
+
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", fake_fetch)
+    monkeypatch.setattr(telegram_bot, "_BATCH_GROUP_SIZE", 2)
+    telegram_bot._PROFILE_CACHE.set("cached", _user("cached"))
+    message = DummyMessage("alice\n@bob, Alice\nghost cached")
+    _run(telegram_bot.handle_text, message)
+
+    assert sorted(calls) == ["alice", "bob", "ghost"]
+    texts = _sent_texts(message)
+    assert texts[0] == messages.get_message("batch_started", count=4)
+    results = "\n".join(texts[1:-1])
+    assert len(texts) == 4  # status, two groups of two lines, summary
+    assert "@cached" in results and "@ghost" in results
+    assert texts[-1] == messages.get_message("batch_done", found=3, total=4)
+    message.reply_document.assert_not_awaited()
+    telegram_bot._PROFILE_CACHE.clear()
+
+
+def test_large_batch_is_returned_as_csv(monkeypatch):
+    telegram_bot._PROFILE_CACHE.clear()
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", _user)
+    monkeypatch.setattr(telegram_bot, "_BATCH_INLINE_LIMIT", 2)
+    message = DummyMessage("/batch one two three")
+    _run(telegram_bot.batch_command, message)
+
+    document = message.reply_document.await_args.args[0]
+    rows = list(csv.DictReader(io.StringIO(document.decode("utf-8-sig"))))
+    assert [row["username"] for row in rows] == ["one", "two", "three"]
+    assert message.reply_document.await_args.kwargs["filename"] == "instagram_profiles.csv"
+    telegram_bot._PROFILE_CACHE.clear()
+
+
+def test_uploaded_document_returns_jsonl_when_asked(monkeypatch):
+    telegram_bot._PROFILE_CACHE.clear()
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", _user)
+    content = bytearray(b"username\nalice\nbob\n")
+    file = SimpleNamespace(download_as_bytearray=AsyncMock(return_value=content))
+    document = SimpleNamespace(
+        file_name="list.csv", file_size=20, get_file=AsyncMock(return_value=file)
+    )
+    message = DummyMessage(document=document, caption="as jsonl please")
+    _run(telegram_bot.handle_document, message)
+
+    output = message.reply_document.await_args.args[0].decode().splitlines()
+    assert len(output) == 2
+    assert message.reply_document.await_args.kwargs["filename"] == "instagram_profiles.jsonl"
+    telegram_bot._PROFILE_CACHE.clear()
+
+
+def test_single_username_message_is_not_a_batch(monkeypatch):
+    telegram_bot._PROFILE_CACHE.clear()
+    looked_up = []
+
+    def fake_fetch(username):
+        looked_up.append(username)
+
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", fake_fetch)
+    for text in ("@alice", "alice alice", "alice\n@Alice", "/batch alice"):
+        message = DummyMessage(text)
+        handler = telegram_bot.batch_command if text.startswith("/") else telegram_bot.handle_text
+        _run(handler, message)
+        assert _sent_texts(message) == [messages.get_escaped_message("error_connection")]
+        message.reply_document.assert_not_awaited()
+    assert looked_up == ["alice"] * 4
+
+
+def test_only_line_separated_lists_and_the_command_start_batches(monkeypatch):
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", lambda u: None)
+    message = DummyMessage("alice bob")
+    _run(telegram_bot.handle_text, message)
+    assert _sent_texts(message) == [messages.get_escaped_message("error_invalid_username")]
+
+    message = DummyMessage("/batch")
+    _run(telegram_bot.batch_command, message)
+    assert _sent_texts(message) == [messages.get_message("batch_usage")]
+
+
+def test_batch_runs_outside_the_handler(monkeypatch):
+    telegram_bot._PROFILE_CACHE.clear()
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", _user)
+    message = DummyMessage("alice\nbob")
+
+    async def run():
+        await telegram_bot.handle_text(DummyUpdate(message), DummyContext())
+        assert _sent_texts(message) == []
+        await asyncio.gather(*telegram_bot._BACKGROUND_TASKS)
+
+    asyncio.run(run())
+    assert _sent_texts(message)[-1] == messages.get_message("batch_done", found=2, total=2)
+    telegram_bot._PROFILE_CACHE.clear()
+
+
+def test_one_batch_per_user_within_the_batch_budget(monkeypatch):
+    telegram_bot._PROFILE_CACHE.clear()
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", _user)
+    limiter = Mock(reserve=Mock(return_value=0))
+    monkeypatch.setattr(telegram_bot, "_BATCH_RATE_LIMITER", limiter)
+    telegram_bot._PROFILE_CACHE.set("cached", _user("cached"))
+    first, second = DummyMessage("alice\nbob\ncached"), DummyMessage("carol\ndave")
+
+    async def run():
+        await telegram_bot.handle_text(DummyUpdate(first), DummyContext())
+        await telegram_bot.handle_text(DummyUpdate(second), DummyContext())
+        await asyncio.gather(*telegram_bot._BACKGROUND_TASKS)
+
+    asyncio.run(run())
+    assert _sent_texts(second) == [messages.get_message("batch_running")]
+    assert _sent_texts(first)[-1] == messages.get_message("batch_done", found=3, total=3)
+    assert limiter.reserve.call_count == 2  # cached profiles take no budget
+    assert not telegram_bot._ACTIVE_BATCHES
+    telegram_bot._PROFILE_CACHE.clear()
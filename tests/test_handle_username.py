@@ -1,12 +1,17 @@
 from types import SimpleNamespace
 from unittest.mock import AsyncMock
 import asyncio
+import threading
+import time
 
-from telegram.constants import ParseMode
+from telegram.constants import ChatAction, ParseMode
+from telegram.error import BadRequest
 from telegram.helpers import escape_markdown
 
 import messages
 import telegram_bot
+from concurrency import BoundedExecutor
+from instagram import ProfileRecord
 
 
 class DummyMessage(SimpleNamespace):
@@ -88,3 +93,206 @@ def test_handle_username_network_error(monkeypatch):
         reply_markup=telegram_bot._back_menu(messages.DEFAULT_LANG),
     )
     assert context.user_data["menu"] == "back"
+
+
+def test_handle_username_coalesces_concurrent_lookups(monkeypatch):
+    calls = []
+    user = {"id": 1, "full_name": "Full", "profile_pic_url": None}
+
+    def fake_fetch(username):
+        calls.append(username)
+        time.sleep(0.05)
+        return {"data": {"user": user}}
+
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", fake_fetch)
+    updates = [DummyUpdate("user"), DummyUpdate("@User"), DummyUpdate(" user ")]
+
+    async def run():
+        await asyncio.gather(
+            *(telegram_bot.handle_username(u, DummyContext()) for u in updates)
+        )
+
+    asyncio.run(run())
+    assert len(calls) == 1
+    for update in updates:
+        update.message.reply_text.assert_awaited()
+
+
+def test_handle_username_busy_when_fetch_queue_full(monkeypatch):
+    release = threading.Event()
+
+    def stalled_fetch(username):
+        release.wait(5)
+        return {"error": "not_found"}
+
+    executor = BoundedExecutor(workers=1, max_queue=0)
+    monkeypatch.setattr(telegram_bot, "_FETCH_EXECUTOR", executor)
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", stalled_fetch)
+    first, second = DummyUpdate("first"), DummyUpdate("second")
+
+    async def run():
+        task = asyncio.create_task(telegram_bot.handle_username(first, DummyContext()))
+        await asyncio.sleep(0.01)
+        await telegram_bot.handle_username(second, DummyContext())
+        release.set()
+        await task
+
+    try:
+        asyncio.run(run())
+    finally:
+        release.set()
+        executor.shutdown()
+    expected = escape_markdown(messages.get_message("error_busy"), version=2)
+    second.message.reply_text.assert_awaited_with(
+        expected,
+        parse_mode=ParseMode.MARKDOWN_V2,
+        reply_markup=telegram_bot._back_menu(messages.DEFAULT_LANG),
+    )
+
+
+def test_handle_username_reuses_telegram_file_id(monkeypatch):
+    telegram_bot._PHOTO_FILE_IDS.clear()
+    user = {"id": 42, "full_name": "Full", "profile_pic_url": "http://cdn/p/42.jpg?sig=1"}
+    monkeypatch.setattr(
+        telegram_bot, "_fetch_instagram_info", lambda u: {"data": {"user": user}}
+    )
+    first = DummyUpdate("user")
+    first.message.reply_photo.return_value = SimpleNamespace(
+        photo=[SimpleNamespace(file_id="small"), SimpleNamespace(file_id="large")]
+    )
+    asyncio.run(telegram_bot.handle_username(first, DummyContext()))
+    assert first.message.reply_photo.await_args.args[0] == "http://cdn/p/42.jpg?sig=1"
+
+    user["profile_pic_url"] = "http://cdn/p/42.jpg?sig=2"
+    second = DummyUpdate("user")
+    asyncio.run(telegram_bot.handle_username(second, DummyContext()))
+    assert second.message.reply_photo.await_args.args[0] == "large"
+
+
+def test_handle_username_falls_back_to_url_for_rejected_file_id(monkeypatch):
+    telegram_bot._PHOTO_FILE_IDS.clear()
+    user = {"id": 43, "full_name": "Full", "profile_pic_url": "http://cdn/p/43.jpg"}
+    telegram_bot._PHOTO_FILE_IDS.set(telegram_bot._photo_key(user), "stale-id")
+    monkeypatch.setattr(
+        telegram_bot, "_fetch_instagram_info", lambda u: {"data": {"user": user}}
+    )
+    update = DummyUpdate("user")
+    update.message.reply_photo.side_effect = [BadRequest("wrong file id"), None]
+    asyncio.run(telegram_bot.handle_username(update, DummyContext()))
+    assert [c.args[0] for c in update.message.reply_photo.await_args_list] == [
+        "stale-id",
+        "http://cdn/p/43.jpg",
+    ]
+    assert telegram_bot._PHOTO_FILE_IDS.get(telegram_bot._photo_key(user)) is None
+
+
+def test_handle_username_skips_chat_action_on_fast_lookup(monkeypatch):
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", lambda u: None)
+    skipped = telegram_bot._CHAT_ACTIONS.value(result="skipped")
+    update = DummyUpdate("user")
+    context = DummyContext()
+    asyncio.run(telegram_bot.handle_username(update, context))
+    context.bot.send_chat_action.assert_not_called()
+    assert telegram_bot._CHAT_ACTIONS.value(result="skipped") == skipped + 1
+
+
+def test_handle_username_sends_chat_action_on_slow_lookup(monkeypatch):
+    def slow_fetch(username):
+        time.sleep(0.1)
+        return None
+
+    monkeypatch.setattr(telegram_bot, "_CHAT_ACTION_DELAY", 0.01)
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", slow_fetch)
+    sent = telegram_bot._CHAT_ACTIONS.value(result="sent")
+    update = DummyUpdate("user")
+    context = DummyContext()
+    asyncio.run(telegram_bot.handle_username(update, context))
+    context.bot.send_chat_action.assert_called_once_with(1, ChatAction.TYPING)
+    assert telegram_bot._CHAT_ACTIONS.value(result="sent") == sent + 1
+
+
+def test_handle_username_rejects_invalid_username_without_fetching(monkeypatch):
+    calls = []
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", calls.append)
+    update = DummyUpdate("not/a..username")
+    context = DummyContext()
+    asyncio.run(telegram_bot.handle_username(update, context))
+    update.message.reply_text.assert_awaited_with(
+        messages.get_escaped_message("error_invalid_username"),
+        parse_mode=ParseMode.MARKDOWN_V2,
+        reply_markup=telegram_bot._back_menu(messages.DEFAULT_LANG),
+    )
+    assert calls == []
+    assert context.user_data["menu"] == "back"
+
+
+def test_handle_username_canonicalizes_profile_links(monkeypatch):
+    calls = []
+
+    def fake_fetch(username):
+        calls.append(username)
+        return None
+
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", fake_fetch)
+    for text in ("https://www.instagram.com/User/?hl=en", " @USER "):
+        asyncio.run(telegram_bot.handle_username(DummyUpdate(text), DummyContext()))
+    assert calls == ["user", "user"]
+
+
+def test_handle_username_memoizes_caption_per_record_and_language(monkeypatch):
+    record = ProfileRecord(id=1, username="user", full_name="Full", profile_pic_url=None)
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", lambda u: record)
+    telegram_bot._render_profile_caption.cache_clear()
+    renders = telegram_bot._CAPTION_RENDERS.value(kind="profile")
+    sent = []
+    for lang in ("en", "en", "fa", "en"):
+        update = DummyUpdate("user")
+        context = DummyContext()
+        context.user_data["lang"] = lang
+        asyncio.run(telegram_bot.handle_username(update, context))
+        sent.append(update.message.reply_text.await_args.args[0])
+    assert telegram_bot._CAPTION_RENDERS.value(kind="profile") == renders + 2
+    assert sent[0] == sent[1] == sent[3] == messages.format_profile_info(record, "en")
+    assert sent[2] == messages.format_profile_info(record, "fa")
+
+    refreshed = ProfileRecord(id=1, username="user", full_name="New", profile_pic_url=None)
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", lambda u: refreshed)
+    update = DummyUpdate("user")
+    context = DummyContext()
+    context.user_data["lang"] = "en"
+    asyncio.run(telegram_bot.handle_username(update, context))
+    assert update.message.reply_text.await_args.args[0] == messages.format_profile_info(
+        refreshed, "en"
+    )
+    info = telegram_bot._render_profile_caption.cache_info()
+    assert info.currsize == 3 and info.maxsize == telegram_bot._CAPTION_CACHE_SIZE
+
+
+def test_cached_profile_is_answered_while_fetch_workers_are_busy(monkeypatch):
+    telegram_bot._PROFILE_CACHE.clear()
+    release = threading.Event()
+    record = ProfileRecord(id=1, username="cached", full_name="Cached")
+
+    def stalled_fetch(username):
+        release.wait(5)
+        return {"error": "not_found"}
+
+    executor = BoundedExecutor(workers=1, max_queue=0)
+    monkeypatch.setattr(telegram_bot, "_FETCH_EXECUTOR", executor)
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", stalled_fetch)
+    telegram_bot._PROFILE_CACHE.set("cached", record)
+
+    async def run():
+        task = asyncio.create_task(telegram_bot._fetch_instagram_info_async("stalled"))
+        await asyncio.sleep(0.01)
+        cached = await telegram_bot._fetch_instagram_info_async("cached")
+        release.set()
+        await task
+        return cached
+
+    try:
+        assert asyncio.run(run()) is record
+    finally:
+        release.set()
+        executor.shutdown()
+        telegram_bot._PROFILE_CACHE.clear()
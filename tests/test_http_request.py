@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from http_request import read_request, write_response
+
+
+def _read(data: bytes, max_headers: int = 10, max_body_size: int = 16):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_request(reader, 1, max_headers, max_body_size)
+
+    return asyncio.run(run())
+
+
+def test_read_request_parses_headers_and_body():
+    request = _read(b"POST /hook?x=1 HTTP/1.1\r\nContent-Length: 2\r\nX-Token: a\r\n\r\nhi")
+    assert request == ("POST", "/hook?x=1", {"content-length": "2", "x-token": "a"}, b"hi")
+    assert _read(b"") is None
+
+
+def test_read_request_enforces_limits():
+    method, target, headers, body = _read(b"POST / HTTP/1.1\r\nContent-Length: 17\r\n\r\n")
+    assert body is None and headers["connection"] == "close"
+    with pytest.raises(ValueError):
+        _read(b"GET / HTTP/1.1\r\n" + b"X-A: 1\r\n" * 3 + b"\r\n", max_headers=2)
+
+    async def slow():
+        return await read_request(asyncio.StreamReader(), 0.01, 10, 16)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(slow())
+
+
+def test_write_response_omits_body_for_head():
+    class Writer:
+        data = b""
+
+        def write(self, data):
+            self.data += data
+
+    writer = Writer()
+    write_response(writer, 200, b"ok", keep_alive=False, head=True)
+    assert writer.data == (
+        b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n"
+        b"Content-Type: text/plain; charset=utf-8\r\nConnection: close\r\n\r\n"
+    )
@@ -0,0 +1,137 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+import asyncio
+import threading
+
+from telegram import InlineQueryResultCachedPhoto, InlineQueryResultPhoto
+
+import messages
+import telegram_bot
+
+
+class DummyInlineUpdate(SimpleNamespace):
+    def __init__(self, query):
+        super().__init__(
+            inline_query=SimpleNamespace(query=query, answer=AsyncMock()),
+            effective_user=SimpleNamespace(id=1),
+        )
+
+
+class DummyUpdate(SimpleNamespace):
+    def __init__(self, text):
+        message = SimpleNamespace(text=text, reply_text=AsyncMock())
+        super().__init__(message=message, effective_chat=SimpleNamespace(id=2))
+
+
+class DummyContext(SimpleNamespace):
+    def __init__(self):
+        super().__init__(
+            user_data={},
+            bot=SimpleNamespace(send_chat_action=AsyncMock()),
+        )
+
+
+_USER = {
+    "id": 1,
+    "username": "user",
+    "full_name": "Full",
+    "profile_pic_url": "http://pic",
+}
+
+
+def test_inline_query_returns_photo(monkeypatch):
+    monkeypatch.setattr(telegram_bot, "_INLINE_DEBOUNCE", 0)
+    telegram_bot._PHOTO_FILE_IDS.clear()
+    monkeypatch.setattr(
+        telegram_bot, "_fetch_instagram_info", lambda u: {"data": {"user": _USER}}
+    )
+    update = DummyInlineUpdate("@user")
+    asyncio.run(telegram_bot.inline_query(update, DummyContext()))
+    results = update.inline_query.answer.await_args.args[0]
+    assert len(results) == 1
+    assert isinstance(results[0], InlineQueryResultPhoto)
+    assert results[0].photo_url == "http://pic"
+    assert results[0].caption == "Full (@user)"
+
+
+def test_inline_query_does_not_block_other_handlers(monkeypatch):
+    monkeypatch.setattr(telegram_bot, "_INLINE_DEBOUNCE", 0)
+    release = threading.Event()
+
+    def stalled_fetch(username):
+        release.wait(5)
+        return {"data": {"user": _USER}}
+
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", stalled_fetch)
+    inline_update = DummyInlineUpdate("user")
+    menu_update = DummyUpdate(messages.get_message("btn_help"))
+
+    async def run():
+        inline_task = asyncio.create_task(
+            telegram_bot.inline_query(inline_update, DummyContext())
+        )
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(
+            telegram_bot.help_command(menu_update, DummyContext()), timeout=1
+        )
+        assert not inline_task.done()
+        release.set()
+        await asyncio.wait_for(inline_task, timeout=1)
+
+    try:
+        asyncio.run(run())
+    finally:
+        release.set()
+    menu_update.message.reply_text.assert_awaited()
+    inline_update.inline_query.answer.assert_awaited()
+
+
+def test_inline_query_rejects_short_or_invalid_queries(monkeypatch):
+    calls = []
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", calls.append)
+    for query in ("ab", "not a username", "bad/name"):
+        update = DummyInlineUpdate(query)
+        asyncio.run(telegram_bot.inline_query(update, DummyContext()))
+        update.inline_query.answer.assert_awaited_with([])
+    assert calls == []
+
+
+def test_inline_query_answers_only_latest_keystroke(monkeypatch):
+    monkeypatch.setattr(telegram_bot, "_INLINE_DEBOUNCE", 0.05)
+    calls = []
+
+    def fake_fetch(username):
+        calls.append(username)
+        return {"data": {"user": dict(_USER, username=username)}}
+
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", fake_fetch)
+    updates = [DummyInlineUpdate(q) for q in ("cri", "cris", "crist")]
+
+    async def run():
+        tasks = []
+        for update in updates:
+            tasks.append(
+                asyncio.create_task(telegram_bot.inline_query(update, DummyContext()))
+            )
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert calls == ["crist"]
+    updates[0].inline_query.answer.assert_not_awaited()
+    updates[1].inline_query.answer.assert_not_awaited()
+    updates[2].inline_query.answer.assert_awaited()
+
+
+def test_inline_query_uses_cached_file_id(monkeypatch):
+    monkeypatch.setattr(telegram_bot, "_INLINE_DEBOUNCE", 0)
+    telegram_bot._PHOTO_FILE_IDS.clear()
+    telegram_bot._PHOTO_FILE_IDS.set(telegram_bot._photo_key(_USER), "file-1")
+    monkeypatch.setattr(
+        telegram_bot, "_fetch_instagram_info", lambda u: {"data": {"user": _USER}}
+    )
+    update = DummyInlineUpdate("user")
+    asyncio.run(telegram_bot.inline_query(update, DummyContext()))
+    results = update.inline_query.answer.await_args.args[0]
+    assert isinstance(results[0], InlineQueryResultCachedPhoto)
+    assert results[0].photo_file_id == "file-1"
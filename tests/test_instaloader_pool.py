@@ -0,0 +1,55 @@
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from instagram import InstaloaderPool  # noqa: E402
+
+
+class FakeLoader:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_reuses_instances():
+    pool = InstaloaderPool(FakeLoader, size=2)
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+    assert second is first
+    assert pool.stats()["created"] == 1
+
+
+def test_pool_recycles_after_max_uses_and_errors():
+    pool = InstaloaderPool(FakeLoader, size=1, max_uses=2)
+    loader = pool.acquire()
+    pool.release(loader)
+    assert pool.acquire() is loader
+    pool.release(loader)
+    assert loader.closed
+    fresh = pool.acquire()
+    assert fresh is not loader
+    pool.release(fresh, discard=True)
+    assert fresh.closed
+    assert pool.stats()["recycled"] == 2
+
+
+def test_pool_blocks_when_exhausted():
+    pool = InstaloaderPool(FakeLoader, size=1)
+    held = pool.acquire()
+    acquired = []
+
+    def worker():
+        acquired.append(pool.acquire())
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join(0.05)
+    assert not acquired
+    pool.release(held)
+    thread.join(1)
+    assert acquired == [held]
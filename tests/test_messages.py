@@ -0,0 +1,39 @@
+from telegram.helpers import escape_markdown
+
+import messages
+import telegram_bot
+
+
+def test_escaped_messages_match_runtime_escaping():
+    for lang in messages._translations:
+        for key in ("start", "help", "error_429", "language_set_en"):
+            assert messages.get_escaped_message(key, lang) == escape_markdown(
+                messages.get_message(key, lang), version=2
+            )
+    assert messages.get_escaped_message("start", "xx") == messages.get_escaped_message(
+        "start", messages.DEFAULT_LANG
+    )
+
+
+def test_get_message_still_formats_kwargs():
+    text = messages.get_message(
+        "profile",
+        "en",
+        id=1,
+        full_name="a",
+        bio="b",
+        followers=1,
+        following=2,
+        media_count=3,
+        is_private="No",
+    )
+    assert text.startswith("✅ **ID:** `1`")
+
+
+def test_keyboards_are_built_once_per_language():
+    assert telegram_bot._main_menu("en") is telegram_bot._main_menu("en")
+    assert telegram_bot._back_menu("fa") is telegram_bot._back_menu("fa")
+    assert telegram_bot._main_menu("xx") is telegram_bot._main_menu(messages.DEFAULT_LANG)
+    assert telegram_bot._language_menu("en", include_back=False) == (
+        telegram_bot._build_language_menu("en", include_back=False)
+    )
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+import asyncio
+
+import telegram_bot
+from metrics import MetricsRegistry, MetricsServer
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    counter = registry.counter("lookups_total", "Lookups.", labels=("result",))
+    histogram = registry.histogram("stage_seconds", "Stages.", labels=("stage",), buckets=(0.1, 1))
+    registry.gauge("depth", "Queue depth.", lambda: 3)
+    counter.inc(result="hit")
+    counter.inc(result="hit")
+    histogram.observe(0.05, stage="cache")
+    histogram.observe(0.5, stage="cache")
+
+    text = registry.render()
+    assert "# TYPE lookups_total counter" in text
+    assert 'lookups_total{result="hit"} 2' in text
+    assert 'stage_seconds_bucket{stage="cache",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="cache",le="+Inf"} 2' in text
+    assert 'stage_seconds_count{stage="cache"} 2' in text
+    assert "depth 3" in text
+
+    snapshot = registry.snapshot()
+    assert snapshot["lookups_total"] == {("hit",): 2}
+    assert snapshot["stage_seconds"][("cache",)]["count"] == 2
+    assert snapshot["depth"] == 3
+
+
+def test_metrics_server_serves_registry():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests.").inc()
+
+    async def scenario():
+        server = MetricsServer(registry, port=0)
+        await server.start()
+        port = server.sockets[0].getsockname()[1]
+        try:
+            responses = []
+            for path in ("/metrics", "/other"):
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+                responses.append(await reader.read())
+                writer.close()
+            return responses
+        finally:
+            await server.stop()
+
+    ok, missing = asyncio.run(scenario())
+    assert ok.startswith(b"HTTP/1.1 200")
+    assert b"requests_total 1" in ok
+    assert missing.startswith(b"HTTP/1.1 404")
+
+
+def test_lookup_stages_and_outcomes_are_recorded(monkeypatch):
+    telegram_bot._fetch_instagram_info.cache_clear()
+    monkeypatch.setattr(telegram_bot, "_load_profile", lambda u: {"error": "not_found"})
+    stages = telegram_bot._STAGE_SECONDS
+    before = {stage: stages.snapshot().get((stage,), {}).get("count", 0)
+              for stage in ("cache", "executor_wait", "instaloader")}
+    misses = telegram_bot._CACHE_LOOKUPS.value(result="miss")
+    hits = telegram_bot._CACHE_LOOKUPS.value(result="hit")
+    not_found = telegram_bot._FETCH_OUTCOMES.value(outcome="not_found")
+
+    update = SimpleNamespace(
+        message=SimpleNamespace(text="ghost", reply_text=AsyncMock(), reply_photo=AsyncMock()),
+        effective_chat=SimpleNamespace(id=1),
+    )
+    context = SimpleNamespace(user_data={}, bot=SimpleNamespace(send_chat_action=AsyncMock()))
+    asyncio.run(telegram_bot.handle_username(update, context))
+    asyncio.run(telegram_bot.handle_username(update, context))
+
+    snapshot = stages.snapshot()
+    assert snapshot[("cache",)]["count"] == before["cache"] + 2
+    # The second lookup is a cache hit and never reaches the executor.
+    assert snapshot[("executor_wait",)]["count"] == before["executor_wait"] + 1
+    assert snapshot[("instaloader",)]["count"] == before["instaloader"] + 1
+    assert telegram_bot._CACHE_LOOKUPS.value(result="miss") == misses + 1
+    assert telegram_bot._CACHE_LOOKUPS.value(result="hit") == hits + 1
+    assert telegram_bot._FETCH_OUTCOMES.value(outcome="not_found") == not_found + 1
+    assert "instaidbot_fetch_queue_depth 0" in telegram_bot._METRICS.render()
+    telegram_bot._fetch_instagram_info.cache_clear()
@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from instagram import normalize_username  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "user",
+        "User",
+        " @user ",
+        "instagram.com/user",
+        "https://www.instagram.com/User/?hl=en",
+        "http://m.instagram.com/user/",
+        "https://instagr.am/user",
+        "https://www.instagram.com/stories/user/3141592653/",
+    ],
+)
+def test_variants_share_one_canonical_name(text):
+    assert normalize_username(text) == "user"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "@",
+        "not a username",
+        "bad/name",
+        "émile",
+        "a" * 31,
+        ".user",
+        "user.",
+        "us..er",
+        "https://www.instagram.com/p/Cabc123/",
+        "https://www.instagram.com/explore/",
+    ],
+)
+def test_invalid_usernames_are_rejected(text):
+    assert normalize_username(text) is None
+
+
+def test_dots_and_underscores_inside_are_allowed():
+    assert normalize_username("Some.User_1") == "some.user_1"
+    assert normalize_username("a" * 30) == "a" * 30
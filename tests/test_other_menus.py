@@ -38,6 +38,7 @@ def test_help_shows_main_menu():
         reply_markup=telegram_bot._main_menu(messages.DEFAULT_LANG),
     )
     assert context.user_data["menu"] == "main"
+    context.bot.send_chat_action.assert_not_called()
 
 
 def test_back_to_menu_shows_main_menu():
@@ -64,3 +65,17 @@ def test_language_command_shows_language_menu():
         reply_markup=telegram_bot._language_menu(messages.DEFAULT_LANG),
     )
     assert context.user_data["language_prev_menu"] == "main"
+
+
+def test_menu_replies_count_skipped_chat_actions():
+    skipped = telegram_bot._CHAT_ACTIONS.value(result="skipped")
+    for handler in (
+        telegram_bot.start,
+        telegram_bot.help_command,
+        telegram_bot.about_command,
+        telegram_bot.language_command,
+        telegram_bot.set_language_en,
+        telegram_bot.back_to_menu,
+    ):
+        asyncio.run(handler(DummyUpdate("x"), DummyContext({"started": True})))
+    assert telegram_bot._CHAT_ACTIONS.value(result="skipped") == skipped + 6
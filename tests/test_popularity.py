@@ -0,0 +1,59 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from popularity import PopularityTracker  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_top_orders_by_lookup_count():
+    tracker = PopularityTracker(clock=FakeClock())
+    for name in ["a", "b", "b", "c", "c", "c"]:
+        tracker.record(name)
+    assert tracker.top(2) == ["c", "b"]
+    assert tracker.top(10) == ["c", "b", "a"]
+    assert tracker.score("c") == pytest.approx(3)
+
+
+def test_old_lookups_decay():
+    clock = FakeClock()
+    tracker = PopularityTracker(half_life=60, clock=clock)
+    for _ in range(4):
+        tracker.record("old")
+    clock.now += 120
+    assert tracker.score("old") == pytest.approx(1)
+    tracker.record("new")
+    tracker.record("new")
+    assert tracker.top(1) == ["new"]
+
+
+def test_scores_are_rebased_instead_of_overflowing():
+    clock = FakeClock()
+    tracker = PopularityTracker(half_life=1, clock=clock)
+    tracker.record("a")
+    clock.now += 5000
+    tracker.record("b")
+    assert tracker.score("b") == pytest.approx(1)
+    assert tracker.score("a") == 0
+    assert tracker.top(2) == ["b", "a"]
+
+
+def test_least_popular_keys_are_pruned():
+    tracker = PopularityTracker(max_keys=10, clock=FakeClock())
+    for i in range(10):
+        for _ in range(i + 1):
+            tracker.record(f"user{i}")
+    tracker.record("newcomer")
+    assert len(tracker) == 10
+    assert tracker.score("user0") == 0
+    assert tracker.stats()["pruned"] == 1
@@ -0,0 +1,203 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from instagram import ProfileRecord  # noqa: E402
+from profile_cache import ProfileCache, SQLiteCache, _approx_size  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_expired_entries_are_dropped_on_lookup():
+    clock = FakeClock()
+    cache = ProfileCache(ttl=10, clock=clock)
+    cache.set("user", {"data": 1})
+    assert cache.get("user") == {"data": 1}
+    clock.now += 11
+    assert cache.get("user") is None
+    assert len(cache) == 0
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["expirations"] == 1
+
+
+def test_lru_eviction_by_entry_count():
+    cache = ProfileCache(ttl=60, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_budget_is_enforced():
+    cache = ProfileCache(ttl=60, max_bytes=1000)
+    for i in range(50):
+        cache.set(f"user{i}", {"bio": "x" * 100})
+    assert cache.current_bytes <= 1000
+    assert 0 < len(cache) < 50
+
+
+def test_periodic_purge_removes_stale_entries():
+    clock = FakeClock()
+    cache = ProfileCache(ttl=10, purge_interval=30, clock=clock)
+    cache.set("old", 1)
+    clock.now += 31
+    cache.set("new", 2)
+    assert len(cache) == 1
+    assert cache.stats()["expirations"] == 1
+
+
+def test_clear_resets_entries_and_counters():
+    cache = ProfileCache(ttl=60)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.current_bytes == 0
+    assert cache.stats()["hits"] == 0
+
+
+def test_negative_entries_are_counted_separately():
+    cache = ProfileCache(ttl=60)
+    cache.set("good", {"data": 1})
+    cache.set("missing", {"error": "not_found"}, ttl=30, negative=True)
+    cache.set("broken", None, ttl=0, negative=True)
+    sentinel = object()
+    assert cache.get("good") == {"data": 1}
+    assert cache.get("missing") == {"error": "not_found"}
+    assert cache.get("broken", sentinel) is sentinel
+    stats = cache.stats()
+    assert stats["positive_hits"] == 1
+    assert stats["negative_hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_get_stale_serves_recently_expired_positive_entries():
+    clock = FakeClock()
+    cache = ProfileCache(ttl=10, stale_ttl=30, clock=clock)
+    cache.set("good", {"data": 1})
+    cache.set("missing", {"error": "not_found"}, ttl=10, negative=True)
+    assert cache.get_stale("good", 30) is None  # still fresh
+    clock.now += 15
+    assert cache.get("good") is None
+    assert cache.get_stale("good", 30) == {"data": 1}
+    assert cache.get_stale("good", 4) is None
+    assert cache.get_stale("missing", 30) is None
+    clock.now += 30
+    assert cache.get_stale("good", 30) is None
+    assert len(cache) == 0
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_expires_in_reports_positive_entries_only():
+    clock = FakeClock()
+    cache = ProfileCache(ttl=10, stale_ttl=30, clock=clock)
+    cache.set("user", {"id": 1})
+    cache.set("ghost", {"error": "not_found"}, ttl=60, negative=True)
+    clock.now += 4
+    assert cache.expires_in("user") == 6
+    assert cache.expires_in("ghost") is None
+    assert cache.expires_in("missing") is None
+    clock.now += 10
+    assert cache.expires_in("user") == -4
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 0
+
+
+def test_zero_ttl_keeps_existing_entry():
+    clock = FakeClock()
+    cache = ProfileCache(ttl=10, stale_ttl=30, clock=clock)
+    cache.set("user", {"data": 1})
+    clock.now += 11
+    cache.set("user", {"error": "status_429"}, ttl=0, negative=True)
+    assert cache.get_stale("user", 30) == {"data": 1}
+
+
+def test_sqlite_backend_survives_restart(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "cache.db")
+    cache = ProfileCache(ttl=10, backend=SQLiteCache(path), clock=clock)
+    cache.set("user", {"data": {"user": {"id": 1, "full_name": "نام"}}})
+    cache.set("missing", {"error": "not_found"}, ttl=5, negative=True)
+
+    restarted = ProfileCache(ttl=10, backend=SQLiteCache(path), clock=clock)
+    assert restarted.get("user") == {"data": {"user": {"id": 1, "full_name": "نام"}}}
+    assert restarted.get("missing") == {"error": "not_found"}
+    assert restarted.stats()["backend_loads"] == 2
+    assert restarted.stats()["negative_hits"] == 1
+    clock.now += 6
+    assert restarted.get("missing") is None
+
+
+def test_sqlite_backend_purges_expired_rows_in_batches(tmp_path):
+    clock = FakeClock()
+    backend = SQLiteCache(str(tmp_path / "cache.db"), batch_size=3)
+    cache = ProfileCache(ttl=10, backend=backend, clock=clock)
+    for i in range(10):
+        cache.set(f"user{i}", i)
+    clock.now += 11
+    cache.set("fresh", 1, ttl=60)
+    assert cache.purge_expired() == 20  # ten in memory plus ten in SQLite
+    assert len(backend) == 1
+
+
+def test_sqlite_backend_round_trips_profile_records(tmp_path):
+    path = str(tmp_path / "cache.db")
+    record = ProfileRecord(id=1, username="user", full_name="نام")
+    ProfileCache(ttl=10, backend=SQLiteCache(path)).set("user", record)
+
+    backend = SQLiteCache(path, decode=ProfileRecord.from_response)
+    restored = ProfileCache(ttl=10, backend=backend).get("user")
+    assert isinstance(restored, ProfileRecord)
+    assert restored == record
+
+
+def test_profile_records_are_smaller_than_nested_dicts():
+    user = {"id": 1, "username": "user", "full_name": "Full", "follower_count": 10}
+    record = ProfileRecord(**user)
+    assert _approx_size(record) < _approx_size(record.as_dict()) / 2
+
+
+def test_async_methods_keep_backend_io_off_the_event_loop(tmp_path):
+    backend = SQLiteCache(str(tmp_path / "cache.db"))
+    threads = []
+    load, store = backend.load, backend.store
+
+    def tracked_load(key, now):
+        threads.append(threading.get_ident())
+        return load(key, now)
+
+    def tracked_store(key, entry):
+        threads.append(threading.get_ident())
+        store(key, entry)
+
+    backend.load, backend.store = tracked_load, tracked_store
+    ProfileCache(ttl=10, backend=SQLiteCache(backend.path)).set("user", {"id": 1})
+    cache = ProfileCache(ttl=10, backend=backend)
+
+    async def run():
+        loaded = await cache.aget("user")
+        threads_after_load = len(threads)
+        again = await cache.aget("user")  # now in memory
+        assert len(threads) == threads_after_load
+        await cache.aset("other", {"id": 2})
+        assert await cache.aexpires_in("other") > 0
+        assert await cache.aget_stale("missing", 10) is None
+        await cache.apop("other")
+        return loaded, again
+
+    assert asyncio.run(run()) == ({"id": 1}, {"id": 1})
+    assert threads and threading.get_ident() not in threads
+    assert cache.get("other") is None
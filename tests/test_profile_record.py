@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from instagram import ProfileRecord  # noqa: E402
+
+_USER = {
+    "id": 1,
+    "username": "user",
+    "full_name": "Full",
+    "biography": "Bio",
+    "follower_count": 10,
+    "following_count": 5,
+    "is_private": False,
+    "media_count": 7,
+    "profile_pic_url": "http://pic",
+}
+
+
+def test_record_reads_like_the_response_dict():
+    record = ProfileRecord(**_USER)
+    assert record.get("error") is None
+    assert record["data"]["user"] is record
+    assert record["data"]["user"]["follower_count"] == 10
+    assert record.get("profile_pic_url") == "http://pic"
+    assert record.get("missing", "x") == "x"
+    with pytest.raises(KeyError):
+        record["missing"]
+
+
+def test_record_converts_to_and_from_dict_shape():
+    record = ProfileRecord.from_response({"data": {"user": _USER}})
+    assert record.as_dict() == {"data": {"user": _USER}}
+    assert ProfileRecord.from_response(record.as_dict()) == record
+    assert ProfileRecord.from_response({"error": "not_found"}) == {"error": "not_found"}
+    assert ProfileRecord.from_response(None) is None
+
+
+def test_record_is_immutable_and_interns_usernames():
+    first = ProfileRecord(username="".join(["us", "er"]))
+    second = ProfileRecord(username="".join(["use", "r"]))
+    assert first.username is second.username
+    with pytest.raises(AttributeError):
+        first.username = "other"
+    with pytest.raises(AttributeError):
+        first.extra = 1
+
@@ -0,0 +1,49 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from instagram import CircuitBreaker, TokenBucket  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_circuit_breaker_opens_and_probes_with_backoff():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, base_backoff=10, max_backoff=25, clock=clock)
+    breaker.record_failure("status_429")
+    assert breaker.allow()
+    breaker.record_failure("status_429")
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now += 10
+    assert breaker.allow()  # half-open probe
+    assert not breaker.allow()  # only one probe at a time
+    breaker.record_failure("status_429")
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 19
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["opened"] == 2
+
+
+def test_token_bucket_reserve_queues_callers_in_order():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=1, clock=clock)
+    assert bucket.reserve(max_wait=1) == 0
+    assert bucket.reserve(max_wait=1) == 0.5
+    assert bucket.reserve(max_wait=1) == 1.0
+    assert bucket.reserve(max_wait=1) is None
+    assert bucket.stats()["throttled"] == 1
+    clock.now += 1.5
+    assert bucket.reserve(max_wait=0) == 0
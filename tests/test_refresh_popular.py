@@ -0,0 +1,122 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import telegram_bot
+from instagram import ProfileRecord
+from popularity import PopularityTracker
+
+
+def _record(username):
+    return ProfileRecord(id=len(username), username=username, full_name=username)
+
+
+def _setup(monkeypatch, fetched):
+    telegram_bot._PROFILE_CACHE.clear()
+    monkeypatch.setattr(telegram_bot, "_POPULARITY", PopularityTracker())
+    monkeypatch.setattr(telegram_bot, "_REFRESH_ALLOWANCE", {"requests": 0.0})
+
+    def fake_fetch(username):
+        fetched.append(username)
+        return _record(username)
+
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_profile", fake_fetch)
+
+
+def test_refresh_renews_popular_profiles_close_to_expiry(monkeypatch):
+    fetched = []
+    _setup(monkeypatch, fetched)
+    monkeypatch.setattr(telegram_bot, "_REFRESH_TOP_K", 2)
+    for name, hits in [("hot", 3), ("warm", 2), ("cold", 1), ("fresh", 5)]:
+        for _ in range(hits):
+            telegram_bot._POPULARITY.record(name)
+    for name in ("hot", "warm", "cold"):
+        telegram_bot._PROFILE_CACHE.set(name, _record(name), ttl=5)
+    telegram_bot._PROFILE_CACHE.set("fresh", _record("fresh"))
+
+    refreshed = asyncio.run(telegram_bot.refresh_popular_profiles())
+
+    # "fresh" is in the top two but far from expiry; "cold" is not popular enough.
+    assert refreshed == 1
+    assert fetched == ["hot"]
+    assert telegram_bot._PROFILE_CACHE.expires_in("hot") > telegram_bot._REFRESH_AHEAD
+
+
+def test_refresh_stays_within_budget_share(monkeypatch):
+    fetched = []
+    _setup(monkeypatch, fetched)
+    monkeypatch.setattr(telegram_bot, "_RATE_LIMIT", 1.0)
+    monkeypatch.setattr(telegram_bot, "_REFRESH_INTERVAL", 10.0)
+    monkeypatch.setattr(telegram_bot, "_REFRESH_BUDGET_SHARE", 0.25)
+    deferred = telegram_bot._CACHE_REFRESHES.value(trigger="popular", result="deferred")
+    for name in ("a", "b", "c", "d"):
+        telegram_bot._POPULARITY.record(name, weight=2)
+        telegram_bot._PROFILE_CACHE.set(name, _record(name), ttl=5)
+
+    assert asyncio.run(telegram_bot.refresh_popular_profiles()) == 2
+    assert telegram_bot._REFRESH_ALLOWANCE["requests"] == 0.5
+    assert telegram_bot._CACHE_REFRESHES.value(trigger="popular", result="deferred") == deferred + 2
+    assert asyncio.run(telegram_bot.refresh_popular_profiles()) == 2
+    assert len(fetched) == 4
+
+
+def test_refresh_skips_usernames_below_the_minimum_score(monkeypatch):
+    fetched = []
+    _setup(monkeypatch, fetched)
+    now = [0.0]
+    tracker = PopularityTracker(half_life=100, clock=lambda: now[0])
+    monkeypatch.setattr(telegram_bot, "_POPULARITY", tracker)
+    monkeypatch.setattr(telegram_bot, "_REFRESH_MIN_SCORE", 1.0)
+    for name, hits in [("busy", 4), ("quiet", 1)]:
+        for _ in range(hits):
+            tracker.record(name)
+        telegram_bot._PROFILE_CACHE.set(name, _record(name), ttl=5)
+
+    now[0] = 50  # "quiet" has decayed below one lookup, "busy" has not
+    assert asyncio.run(telegram_bot.refresh_popular_profiles()) == 1
+    now[0] = 300
+    telegram_bot._PROFILE_CACHE.set("busy", _record("busy"), ttl=5)
+    assert asyncio.run(telegram_bot.refresh_popular_profiles()) == 0
+    assert fetched == ["busy"]
+
+
+def test_refresh_pauses_while_circuit_is_open(monkeypatch):
+    fetched = []
+    _setup(monkeypatch, fetched)
+    telegram_bot._POPULARITY.record("user")
+    telegram_bot._PROFILE_CACHE.set("user", _record("user"), ttl=5)
+    monkeypatch.setattr(telegram_bot._CIRCUIT_BREAKER, "state", telegram_bot.CircuitBreaker.OPEN)
+
+    assert asyncio.run(telegram_bot.refresh_popular_profiles()) == 0
+    assert fetched == []
+
+
+def test_lookups_feed_the_popularity_tracker(monkeypatch):
+    _setup(monkeypatch, [])
+    monkeypatch.setattr(telegram_bot, "_fetch_instagram_info", lambda username: _record(username))
+    asyncio.run(telegram_bot._fetch_instagram_info_async("user"))
+    asyncio.run(telegram_bot._fetch_instagram_info_async("user"))
+    assert telegram_bot._POPULARITY.score("user") > 1.9
+
+
+def test_warm_up_fetches_uncached_profiles(monkeypatch):
+    fetched = []
+    _setup(monkeypatch, fetched)
+    telegram_bot._PROFILE_CACHE.set("cached", _record("cached"))
+
+    assert asyncio.run(telegram_bot.warm_up_cache(["cached", "new"])) == 1
+    assert fetched == ["new"]
+    assert telegram_bot._PROFILE_CACHE.get("new") == _record("new")
+    assert set(telegram_bot._POPULARITY.top(2)) == {"cached", "new"}
+
+
+def test_post_init_schedules_refresh_job(monkeypatch):
+    monkeypatch.setattr(telegram_bot, "_WARMUP_USERNAMES", "")
+    job_queue = Mock()
+    telegram_bot._schedule_cache_maintenance(SimpleNamespace(job_queue=job_queue))
+    job_queue.run_repeating.assert_called_once_with(
+        telegram_bot.refresh_popular_profiles,
+        interval=telegram_bot._REFRESH_INTERVAL,
+        first=telegram_bot._REFRESH_INTERVAL,
+        name="refresh_popular_profiles",
+    )
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+import asyncio
+
+import messages
+import telegram_bot
+
+
+def _update(text):
+    return SimpleNamespace(message=SimpleNamespace(text=text))
+
+
+def test_every_button_label_is_dispatched():
+    for lang in messages._translations:
+        assert telegram_bot._BUTTON_HANDLERS[messages.get_message("btn_help", lang)] is (
+            telegram_bot.help_command
+        )
+        assert telegram_bot._BUTTON_HANDLERS[messages.get_message("btn_back", lang)] is (
+            telegram_bot.back_to_menu
+        )
+
+
+def test_handle_text_routes_buttons_and_usernames(monkeypatch):
+    help_mock, username_mock = AsyncMock(), AsyncMock()
+    monkeypatch.setattr(
+        telegram_bot,
+        "_BUTTON_HANDLERS",
+        {messages.get_message("btn_help", "en"): help_mock},
+    )
+    monkeypatch.setattr(telegram_bot, "handle_username", username_mock)
+    button = _update(messages.get_message("btn_help", "en"))
+    other = _update("cristiano")
+    asyncio.run(telegram_bot.handle_text(button, None))
+    asyncio.run(telegram_bot.handle_text(other, None))
+    help_mock.assert_awaited_once_with(button, None)
+    username_mock.assert_awaited_once_with(other, None)
@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+import asyncio
+import threading
+
+import user_store
+from user_store import UserStore
+
+
+def test_records_survive_restart_after_flush(tmp_path):
+    path = str(tmp_path / "users.db")
+    store = UserStore(path)
+    store.get(1)["lang"] = "en"
+    store.get(1)["started"] = True
+    store.get(2)["menu"] = "main"
+    assert UserStore(path).get(1) == {}  # nothing written before a flush
+    assert store.flush() == 2
+    assert store.flush() == 0
+
+    restarted = UserStore(path)
+    assert restarted.get(1) == {"lang": "en", "started": True}
+    assert restarted.stats()["loads"] == 1
+
+
+def test_cold_users_are_evicted_without_losing_changes(tmp_path):
+    store = UserStore(str(tmp_path / "users.db"), max_users=2)
+    for user_id in range(5):
+        store.get(user_id)["lang"] = "en"
+    assert len(store) == 2
+    assert store.stats()["evictions"] == 3
+    assert store.get(0) == {"lang": "en"}  # served from the pending batch
+    assert store.flush() == 5
+    assert UserStore(store.path).get(3) == {"lang": "en"}
+
+
+def test_autoflush_and_close(tmp_path):
+    store = UserStore(str(tmp_path / "users.db"))
+
+    async def run():
+        store.start_autoflush(0.01)
+        store.get(7)["lang"] = "fa"
+        await asyncio.sleep(0.05)
+        assert store.stats()["flushes"] == 1
+        store.get(7)["menu"] = "back"
+        await store.close()
+
+    asyncio.run(run())
+    assert UserStore(store.path).get(7) == {"lang": "fa", "menu": "back"}
+
+
+def test_context_type_reads_user_data_from_store(tmp_path):
+    store = UserStore(str(tmp_path / "users.db"))
+    context_cls = user_store.context_type(store)
+    context = context_cls(SimpleNamespace(), user_id=3)
+    context.user_data["lang"] = "en"
+    assert store.get(3) == {"lang": "en"}
+    assert context_cls(SimpleNamespace()).user_data is None
+
+
+def test_processes_sharing_the_database_merge_their_changes(tmp_path):
+    now = [0.0]
+    path = str(tmp_path / "users.db")
+    first = UserStore(path, max_age=30, clock=lambda: now[0])
+    second = UserStore(path, max_age=30, clock=lambda: now[0])
+    first.get(1)["lang"] = "fa"
+    second.get(1)["menu"] = "main"
+    first.flush()
+    second.flush()
+    assert UserStore(path).get(1) == {"lang": "fa", "menu": "main"}
+
+    # aload re-reads a cached record once it is older than max_age, keeping
+    # changes that were not flushed yet.
+    second.get(1)["started"] = True
+    first.get(1)["lang"] = "en"
+    first.flush()
+    assert asyncio.run(second.aload(1)) == {"menu": "main", "started": True}
+    now[0] = 31
+    assert "lang" not in second.get(1)  # get() never reads the database
+    assert asyncio.run(second.aload(1)) == {"lang": "en", "menu": "main", "started": True}
+    assert second.stats()["reloads"] == 1
+    second.get(1).pop("menu")
+    second.flush()
+    assert UserStore(path).get(1) == {"lang": "en", "started": True}
+
+
+def test_aload_reads_the_database_off_the_event_loop(tmp_path):
+    store = UserStore(str(tmp_path / "users.db"))
+    store.get(5)["lang"] = "fa"
+    store.flush()
+    restarted = UserStore(store.path)
+    threads = []
+    read = restarted._read
+
+    def tracking_read(user_id):
+        threads.append(threading.current_thread())
+        return read(user_id)
+
+    restarted._read = tracking_read
+    assert asyncio.run(restarted.aload(5)) == {"lang": "fa"}
+    assert restarted.get(5) == {"lang": "fa"}
+    assert threads and threading.main_thread() not in threads
+    assert len(threads) == 1
@@ -0,0 +1,161 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+import asyncio
+
+import httpx
+
+import webhook
+
+RECORDED_UPDATE = {
+    "update_id": 10001,
+    "message": {
+        "message_id": 5,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private", "first_name": "Test"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+        "text": "cristiano",
+    },
+}
+
+
+def _application():
+    return SimpleNamespace(bot=None, update_queue=asyncio.Queue())
+
+
+async def _with_server(server, requests):
+    await server.start()
+    port = server.sockets[0].getsockname()[1]
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            return [await request(client) for request in requests]
+    finally:
+        await server.stop()
+
+
+def test_webhook_accepts_update_with_valid_secret():
+    app = _application()
+    server = webhook.WebhookServer(app, secret_token="s3cret", host="127.0.0.1", port=0)
+    responses = asyncio.run(
+        _with_server(
+            server,
+            [
+                lambda c: c.post(
+                    "/telegram",
+                    json=RECORDED_UPDATE,
+                    headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"},
+                ),
+                lambda c: c.get("/healthz"),
+            ],
+        )
+    )
+    assert [r.status_code for r in responses] == [200, 200]
+    assert responses[1].text == "ok"
+    update = app.update_queue.get_nowait()
+    assert update.update_id == 10001
+    assert update.message.text == "cristiano"
+
+
+def test_webhook_rejects_bad_requests():
+    app = _application()
+    server = webhook.WebhookServer(
+        app, secret_token="s3cret", host="127.0.0.1", port=0, max_body_size=4096
+    )
+    responses = asyncio.run(
+        _with_server(
+            server,
+            [
+                lambda c: c.post("/telegram", json=RECORDED_UPDATE),
+                lambda c: c.post(
+                    "/telegram",
+                    json=RECORDED_UPDATE,
+                    headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+                ),
+                lambda c: c.post(
+                    "/telegram",
+                    content=b"not json",
+                    headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"},
+                ),
+                lambda c: c.get("/telegram"),
+                lambda c: c.get("/other"),
+                lambda c: c.post("/telegram", content=b"x" * 5000),
+            ],
+        )
+    )
+    assert [r.status_code for r in responses] == [403, 403, 400, 405, 404, 413]
+    assert app.update_queue.empty()
+    assert server.rejected == 4
+
+
+def test_webhook_head_health_check_keeps_connection_usable():
+    server = webhook.WebhookServer(_application(), host="127.0.0.1", port=0)
+    responses = asyncio.run(
+        _with_server(server, [lambda c: c.head("/healthz"), lambda c: c.get("/healthz")])
+    )
+    assert [r.status_code for r in responses] == [200, 200]
+    assert responses[0].headers["content-length"] == "2"
+    assert responses[1].text == "ok"
+
+
+def test_webhook_closes_idle_slow_and_oversized_connections():
+    app = _application()
+    server = webhook.WebhookServer(
+        app, host="127.0.0.1", port=0, read_timeout=0.1, max_headers=3, max_line_size=256
+    )
+
+    async def closed_after(payload):
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(payload)
+        try:
+            return await asyncio.wait_for(reader.read(), 2)
+        finally:
+            writer.close()
+
+    async def run():
+        await server.start()
+        try:
+            return [
+                await closed_after(b""),
+                await closed_after(b"POST /telegram HTTP/1.1\r\nHost: x\r\n"),
+                await closed_after(b"GET /healthz HTTP/1.1\r\n" + b"X-A: 1\r\n" * 4 + b"\r\n"),
+                await closed_after(b"GET /" + b"a" * 300 + b" HTTP/1.1\r\n\r\n"),
+            ]
+        finally:
+            await server.stop()
+
+    assert asyncio.run(run()) == [b"", b"", b"", b""]
+
+
+def test_serve_webhook_runs_full_lifecycle():
+    app = SimpleNamespace(
+        bot=SimpleNamespace(set_webhook=AsyncMock()),
+        update_queue=asyncio.Queue(),
+        initialize=AsyncMock(),
+        start=AsyncMock(),
+        stop=AsyncMock(),
+        shutdown=AsyncMock(),
+        post_init=AsyncMock(),
+        post_stop=None,
+        post_shutdown=None,
+        running=True,
+    )
+    server = webhook.WebhookServer(app, secret_token="s3cret", host="127.0.0.1", port=0)
+
+    async def run():
+        stop = asyncio.Event()
+        task = asyncio.create_task(
+            webhook.serve_webhook(app, "https://bot.example", server, stop=stop)
+        )
+        while not server.sockets:
+            await asyncio.sleep(0.01)
+        stop.set()
+        await task
+
+    asyncio.run(run())
+    app.post_init.assert_awaited_once_with(app)
+    app.bot.set_webhook.assert_awaited_once()
+    assert app.bot.set_webhook.await_args.args[0] == "https://bot.example/telegram"
+    assert app.bot.set_webhook.await_args.kwargs["secret_token"] == "s3cret"
+    app.stop.assert_awaited_once()
+    app.shutdown.assert_awaited_once()
+    assert not server.sockets
@@ -0,0 +1,355 @@
+"""SQLite-backed, lazily loaded and batch-flushed storage for ``user_data``."""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from telegram.ext import CallbackContext
+
+LOGGER = logging.getLogger(__name__)
+
+
+class UserRecord(dict):
+    """``dict`` that remembers which keys were modified since the last flush."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.changed = set()
+        self.loaded_at = 0.0
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.changed)
+
+    def __setitem__(self, key, value):
+        self.changed.add(key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.changed.add(key)
+
+    def pop(self, key, *default):
+        if key in self:
+            self.changed.add(key)
+        return super().pop(key, *default)
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.changed.add(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.changed.add(key)
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        items = dict(*args, **kwargs)
+        self.changed.update(items)
+        super().update(items)
+
+    def clear(self):
+        self.changed.update(self)
+        super().clear()
+
+    def patch(self) -> str:
+        """Serialise the changed keys as ``{"set": {...}, "unset": [...]}``."""
+        return json.dumps(
+            {
+                "set": {key: self[key] for key in self.changed if key in self},
+                "unset": [key for key in self.changed if key not in self],
+            },
+            ensure_ascii=False,
+        )
+
+
+def _apply_patch(data: dict, patch: str) -> dict:
+    changes = json.loads(patch)
+    data.update(changes["set"])
+    for key in changes["unset"]:
+        data.pop(key, None)
+    return data
+
+
+def _merge_patches(older: str, newer: str) -> str:
+    old, new = json.loads(older), json.loads(newer)
+    merged = {key: value for key, value in old["set"].items() if key not in new["unset"]}
+    merged.update(new["set"])
+    unset = set(old["unset"]).difference(new["set"]).union(new["unset"])
+    return json.dumps({"set": merged, "unset": sorted(unset)}, ensure_ascii=False)
+
+
+class UserStore:
+    """Per-user ``user_data`` kept in memory (LRU) and persisted to SQLite.
+
+    Records are loaded from the database on first access and only the most
+    recently used ``max_users`` are kept in memory. Modified records are not
+    written on every update: :meth:`flush` writes all of them in a single
+    transaction, usually from the task started by :meth:`start_autoflush`.
+    Values must be JSON-serialisable.
+
+    Several bot processes can share the database (it uses WAL mode). Only
+    the keys a process changed are written, merged into the stored record
+    under a write lock, so processes changing different keys of the same
+    user do not overwrite each other, and records cached for more than
+    ``max_age`` seconds are re-read by :meth:`aload` so changes made by
+    other processes show up. For the same key the last flush wins.
+
+    :meth:`get` only reads memory once a record is loaded; await
+    :meth:`aload` before handling an update so the database is read in a
+    thread rather than on the event loop.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_users: int = 50_000,
+        timeout: float = 5,
+        max_age: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.path = path
+        self.max_users = max_users
+        self.timeout = timeout
+        self.max_age = max_age
+        self._clock = clock
+        self._records: "OrderedDict[int, UserRecord]" = OrderedDict()
+        # Changes (see ``UserRecord.patch``) of records evicted before being flushed.
+        self._pending: Dict[int, str] = {}
+        self._local = threading.local()
+        self._flush_task: Optional["asyncio.Task"] = None
+        # Bumped whenever changes are collected for a write; a read that
+        # overlapped a write may miss it and is repeated.
+        self._flush_epoch = 0
+        self._no_write_running = asyncio.Event()
+        self._no_write_running.set()
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.written = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, user_id: int) -> UserRecord:
+        """Return the record for ``user_id``.
+
+        Records already in memory are returned as they are. One that is not
+        (because :meth:`aload` was not awaited first) is read from the
+        database on the calling thread.
+        """
+        record = self._records.get(user_id)
+        if record is not None:
+            self._records.move_to_end(user_id)
+            return record
+        return self._install(user_id, self._read(user_id))
+
+    async def aload(self, user_id: int) -> UserRecord:
+        """Load the record for ``user_id`` into memory without blocking the loop.
+
+        A record loaded more than ``max_age`` seconds ago is refreshed in
+        place, keeping this process's unflushed changes.
+        """
+        record = self._records.get(user_id)
+        if record is not None and self._clock() - record.loaded_at <= self.max_age:
+            self._records.move_to_end(user_id)
+            return record
+        while True:
+            await self._no_write_running.wait()
+            epoch = self._flush_epoch
+            stored = await asyncio.to_thread(self._read, user_id)
+            if epoch == self._flush_epoch:
+                break
+        record = self._records.get(user_id)
+        if record is None:
+            return self._install(user_id, stored)
+        self._records.move_to_end(user_id)
+        self._refresh(record, stored)
+        return record
+
+    def flush(self) -> int:
+        """Write every modified record to the database and return how many."""
+        batch = self._collect_dirty()
+        try:
+            return self._write(batch)
+        except sqlite3.Error:
+            self._requeue(batch)
+            raise
+
+    async def flush_async(self) -> int:
+        """Like :meth:`flush` but performs the database write in a thread."""
+        batch = self._collect_dirty()
+        self._no_write_running.clear()
+        try:
+            return await asyncio.to_thread(self._write, batch)
+        except sqlite3.Error:
+            self._requeue(batch)
+            raise
+        finally:
+            self._no_write_running.set()
+
+    def start_autoflush(self, interval: float) -> None:
+        """Start a background task that flushes every ``interval`` seconds."""
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(
+                self._autoflush(interval)
+            )
+
+    async def close(self) -> None:
+        """Stop the background flush task and write outstanding changes."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush_async()
+
+    def stats(self) -> dict:
+        return {
+            "cached_users": len(self._records),
+            "dirty_users": sum(r.dirty for r in self._records.values()) + len(self._pending),
+            "loads": self.loads,
+            "reloads": self.reloads,
+            "evictions": self.evictions,
+            "flushes": self.flushes,
+            "written": self.written,
+        }
+
+    async def _autoflush(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush_async()
+            except sqlite3.Error as err:
+                LOGGER.warning("Flushing user data failed: %s", err)
+
+    def _read(self, user_id: int) -> Optional[dict]:
+        """Return the stored record, or ``None`` when it cannot be read."""
+        try:
+            row = self._conn().execute(
+                "SELECT data FROM user_data WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        except sqlite3.Error as err:
+            LOGGER.warning("Loading user data for %s failed: %s", user_id, err)
+            return None
+        return json.loads(row[0]) if row else {}
+
+    def _install(self, user_id: int, stored: Optional[dict]) -> UserRecord:
+        """Cache a record built from ``stored``, evicting the coldest ones."""
+        self.loads += 1
+        record = UserRecord(stored or {})
+        record.loaded_at = self._clock()
+        patch = self._pending.pop(user_id, None)
+        if patch is not None:
+            # Re-apply changes evicted before they were flushed.
+            changes = json.loads(patch)
+            record.update(changes["set"])
+            for key in changes["unset"]:
+                record.pop(key, None)
+            record.changed.update(changes["unset"])
+        self._records[user_id] = record
+        while len(self._records) > self.max_users:
+            old_id, old = self._records.popitem(last=False)
+            self.evictions += 1
+            if old.dirty:
+                self._add_pending(old_id, old.patch())
+        return record
+
+    def _refresh(self, record: UserRecord, stored: Optional[dict]) -> None:
+        """Replace ``record``'s contents with ``stored`` plus its unflushed changes."""
+        record.loaded_at = self._clock()
+        if stored is None:
+            return
+        self.reloads += 1
+        for key in record.changed:
+            if key in record:
+                stored[key] = record[key]
+            else:
+                stored.pop(key, None)
+        dict.clear(record)
+        dict.update(record, stored)
+
+    def _add_pending(self, user_id: int, patch: str) -> None:
+        older = self._pending.get(user_id)
+        self._pending[user_id] = patch if older is None else _merge_patches(older, patch)
+
+    def _collect_dirty(self) -> List[Tuple[int, str]]:
+        """Serialise changed keys on the caller's thread and mark records clean."""
+        self._flush_epoch += 1
+        batch = list(self._pending.items())
+        self._pending.clear()
+        for user_id, record in self._records.items():
+            if record.dirty:
+                batch.append((user_id, record.patch()))
+                record.changed.clear()
+        return batch
+
+    def _requeue(self, batch: List[Tuple[int, str]]) -> None:
+        for user_id, patch in reversed(batch):
+            newer = self._pending.get(user_id)
+            self._pending[user_id] = patch if newer is None else _merge_patches(patch, newer)
+
+    def _write(self, batch: List[Tuple[int, str]]) -> int:
+        """Merge each patch into the stored record under one write lock."""
+        if not batch:
+            return 0
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for user_id, patch in batch:
+                row = conn.execute(
+                    "SELECT data FROM user_data WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                data = _apply_patch(json.loads(row[0]) if row else {}, patch)
+                conn.execute(
+                    "INSERT OR REPLACE INTO user_data (user_id, data, updated_at)"
+                    " VALUES (?, ?, ?)",
+                    (user_id, json.dumps(data, ensure_ascii=False), now),
+                )
+        self.flushes += 1
+        self.written += len(batch)
+        return len(batch)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Opened lazily so creating a store does not touch the disk.
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS user_data ("
+                    " user_id INTEGER PRIMARY KEY,"
+                    " data TEXT NOT NULL,"
+                    " updated_at REAL NOT NULL)"
+                )
+            self._local.conn = conn
+        return conn
+
+
+def context_type(store: UserStore) -> type:
+    """Return a ``CallbackContext`` subclass whose ``user_data`` lives in ``store``.
+
+    Pass it as ``ContextTypes(context=...)`` so PTB's own in-memory
+    ``user_data`` mapping (which never shrinks) is bypassed.
+    """
+
+    class StoreBackedContext(CallbackContext):
+        @property
+        def user_data(self) -> Optional[UserRecord]:
+            if self._user_id is None:
+                return None
+            return store.get(self._user_id)
+
+    return StoreBackedContext
@@ -0,0 +1,174 @@
+"""Minimal asyncio HTTP server that feeds Telegram webhook updates to PTB."""
+
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from typing import Optional, Tuple
+
+from telegram import Update
+
+from http_request import read_request, write_response
+
+LOGGER = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+
+class WebhookServer:
+    """Accept Telegram webhook POSTs and put the updates on PTB's queue.
+
+    ``POST <path>`` must carry ``secret_token`` in the
+    ``X-Telegram-Bot-Api-Secret-Token`` header (when one is configured) and a
+    JSON update body. ``GET <health_path>`` answers ``ok`` while the server
+    runs, for load balancer health checks.
+
+    Every read (including waiting for the next request on a keep-alive
+    connection) must finish within ``read_timeout`` seconds, request and
+    header lines are limited to ``max_line_size`` bytes and requests to
+    ``max_headers`` headers; connections breaking these limits are closed.
+    """
+
+    def __init__(
+        self,
+        application,
+        path: str = "/telegram",
+        secret_token: Optional[str] = None,
+        host: str = "0.0.0.0",
+        port: int = 8443,
+        health_path: str = "/healthz",
+        max_body_size: int = 1024 * 1024,
+        read_timeout: float = 30,
+        max_headers: int = 100,
+        max_line_size: int = 8192,
+    ) -> None:
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.health_path = health_path
+        self.max_body_size = max_body_size
+        self.read_timeout = read_timeout
+        self.max_headers = max_headers
+        self.max_line_size = max_line_size
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers = set()
+        self.received = 0
+        self.rejected = 0
+
+    @property
+    def sockets(self):
+        return self._server.sockets if self._server else ()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port, limit=self.max_line_size
+        )
+        LOGGER.info("Webhook server listening on %s:%s%s", self.host, self.port, self.path)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Idle keep-alive connections would otherwise block wait_closed().
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                request = await read_request(
+                    reader, self.read_timeout, self.max_headers, self.max_body_size
+                )
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload = await self._dispatch(method, target, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                write_response(writer, status, payload, keep_alive, head=method == "HEAD")
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _dispatch(
+        self, method: str, target: str, headers: dict, body: Optional[bytes]
+    ) -> Tuple[int, bytes]:
+        path = target.split("?", 1)[0]
+        if path == self.health_path:
+            return (200, b"ok") if method in ("GET", "HEAD") else (405, b"")
+        if path != self.path:
+            return 404, b""
+        if method != "POST":
+            return 405, b""
+        if body is None:
+            self.rejected += 1
+            return 413, b""
+        if self.secret_token and not hmac.compare_digest(
+            headers.get(SECRET_HEADER, ""), self.secret_token
+        ):
+            self.rejected += 1
+            LOGGER.warning("Rejected webhook request with invalid secret token")
+            return 403, b""
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError) as err:
+            self.rejected += 1
+            LOGGER.warning("Rejected malformed webhook update: %s", err)
+            return 400, b""
+        self.received += 1
+        await self.application.update_queue.put(update)
+        return 200, b""
+
+
+async def serve_webhook(
+    application,
+    webhook_url: str,
+    server: WebhookServer,
+    max_connections: int = 40,
+    allowed_updates=Update.ALL_TYPES,
+    stop: Optional[asyncio.Event] = None,
+) -> None:
+    """Run ``application`` behind ``server`` until SIGINT/SIGTERM or ``stop`` is set.
+
+    Mirrors ``Application.run_polling``'s lifecycle: ``post_init`` runs after
+    initialisation, and ``post_stop``/``post_shutdown`` run on the way out.
+    """
+    stop = stop or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):  # pragma: no cover - Windows
+            pass
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    try:
+        await application.bot.set_webhook(
+            webhook_url + server.path,
+            secret_token=server.secret_token,
+            max_connections=max_connections,
+            allowed_updates=allowed_updates,
+        )
+        await application.start()
+        await server.start()
+        await stop.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)